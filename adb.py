@@ -1,16 +1,28 @@
+import collections
+import json
 import os
 import random
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy
 
-__adb = os.path.abspath('platform-tools/adb.exe')
-__arknights = 'com.hypergryph.arknights/com.u8.sdk.U8UnityContext'
-__max0035, __max0036 = 0, 0
+import adbclient
+import tracing
 
+ADB = os.path.abspath('platform-tools/adb.exe') if os.name == 'nt' else shutil.which('adb') or 'adb'
+__device = None
+__profiles = None
 
+
+@tracing.traced('devices')
 def devices() -> list[str]:
     """Returns a list of attached devices' serial numbers."""
-    connected = os.popen(__adb + ' devices').read()
-    return connected.splitlines()[1:-1]
+    return adbclient.Client(adb=ADB).devices()
 
 
 def connect(method: str = '-e', serial_number: str = '') -> None:
@@ -24,7 +36,16 @@ def connect(method: str = '-e', serial_number: str = '') -> None:
             * `-s`: Connect to a specified device.
         * `serial_number`: The serial number of  device to be connected.
     """
-    os.system(__adb + ' ' + method + ' ' + serial_number)
+    global __device
+    __device = Device(serial_number if method == '-s' else '')
+
+
+def device() -> 'Device':
+    """Returns the connected device which the module-level functions operate on."""
+    global __device
+    if __device is None:
+        __device = Device()
+    return __device
 
 
 def wm_size() -> int and int:
@@ -34,43 +55,184 @@ def wm_size() -> int and int:
         * The horizontal resolution of the screen.
         * The vertical resolution of the screen.
     """
-    content = os.popen(__adb + ' shell wm size').read()
-    resolution = content.split()[2]
-    return map(int, resolution.split('x'))
+    return device().wm_size()
 
 
 def wm_density() -> int:
     """Returns the screen density of the connected device"""
-    return int(os.popen(__adb + ' shell wm density').read().split()[2])
+    return device().wm_density()
 
 
 def start_arknights() -> None:
     """Start Arknights on the connected device"""
-    os.system(__adb + ' shell am start -n ' + __arknights)
+    device().start_arknights()
 
 
-def pull(device_path: str, computer_path: str) -> None:
+def pull(device_path: str, computer_path: str) -> int:
     """Copy files from device to computer.
 
     Copy the file in the specified path on the device to the specified path on the computer.
 
     Args:
         `device_path`: The path of the file to be copied.
-        `computer_path`: The path of to be copied to.
+        `computer_path`: The path of to be copied to, or a directory it is copied into.
+
+    Returns:
+        The size of the file.
     """
-    os.system(__adb + ' pull ' + device_path + ' ' + computer_path)
+    return device().pull(device_path, computer_path)
 
 
-def push(computer_path: str, device_path: str) -> None:
+def push(computer_path: str, device_path: str) -> int:
     """Copy files from computer to device.
 
     Copy the file in the specified path on the computer to the specified path on the device.
 
     Args:
         `computer_path`: The path of the file to be copied.
-        `device_path`: The path of the file to be copied to.
+        `device_path`: The path of the file to be copied to, or a directory it is copied into.
+
+    Returns:
+        The size of the file.
+    """
+    return device().push(computer_path, device_path)
+
+
+def pull_changed(device_path: str, computer_path: str, compare: str = 'md5') -> dict:
+    """Copy a file or a directory tree from device to computer, skipping the unchanged files.
+
+    See `adbclient.Client.pull_changed`.
     """
-    os.system(__adb + ' push ' + computer_path + ' ' + device_path)
+    return device().pull_changed(device_path, computer_path, compare)
+
+
+def push_changed(computer_path: str, device_path: str, compare: str = 'md5') -> dict:
+    """Copy a file or a directory tree from computer to device, skipping the unchanged files.
+
+    See `adbclient.Client.push_changed`.
+    """
+    return device().push_changed(computer_path, device_path, compare)
+
+
+class Shell:
+    """A persistent shell session on a device.
+
+    Commands are streamed to one long-lived `sh` opened by the `exec:` service of the adb
+    server instead of spawning a new `adb` process for every command, which saves the process
+    and shell startup time. The round trip time of every command is recorded in `latencies`.
+
+    Example:
+
+        with Shell() as shell:
+            shell.run('input tap 100 200')
+            print(shell.mean_latency())
+    """
+
+    __marker = '__ASH_DONE__'
+
+    def __init__(self, serial: str = '', history: int = 1000, client: adbclient.Client = None,
+                 timeout: float = 30) -> None:
+        """Create a shell session, the shell is started on the first command.
+
+        Args:
+            * `serial`: Optional; The serial number of the device, the only device if empty.
+            * `history`: Optional; How many latencies are kept in `latencies`.
+            * `client`: Optional; The client of the adb server, a new one for `serial` if `None`.
+            * `timeout`: Optional; The maximum time in seconds to wait for the output of a command,
+            forever if `None`.
+        """
+        self.serial = serial
+        self.timeout = timeout
+        self.client = client or adbclient.Client(serial, adb=ADB)
+        self.latencies = collections.deque(maxlen=history)
+        self.__connection = None
+        self.__lock = threading.Lock()
+
+    def __enter__(self) -> 'Shell':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start the shell if it is not running."""
+        if self.__connection is None:
+            with tracing.span('shell.start', self.serial):
+                # 错误输出合并到输出中, 命令失败时随异常一起报告
+                self.__connection = self.client.exec('sh 2>&1')
+
+    @tracing.traced('shell.run')
+    def run(self, command: str) -> str:
+        """Run a command in the shell and wait for it to finish.
+
+        Args:
+            `command`: The shell command to run.
+
+        Returns:
+            The output of the command, including what it printed to stderr.
+
+        Raises:
+            CalledProcessError: The command exited with a non-zero status.
+            ConnectionError: The shell exited before the command finished.
+            TimeoutError: The command printed nothing for `timeout` seconds, the shell is closed.
+        """
+        with self.__lock:
+            self.start()
+            begin = time.perf_counter()
+            self.__connection.socket.settimeout(self.timeout)
+            stream = self.__connection.file
+            try:
+                # 标记前先换行, 这样没有以换行结尾的输出也不会和标记在同一行; 标记后是命令的退出状态
+                stream.write((command + "; printf '\\n%s %d\\n' " + self.__marker + ' $?\n').encode())
+                stream.flush()
+            except OSError:
+                self.__connection = None
+                raise ConnectionError('adb shell exited before running: ' + command)
+            lines = []
+            while True:
+                try:
+                    line = stream.readline()
+                except TimeoutError:
+                    self.__connection.close()
+                    self.__connection = None
+                    raise TimeoutError('adb shell timed out running: ' + command) from None
+                if not line:
+                    self.__connection.close()
+                    self.__connection = None
+                    raise ConnectionError('adb shell exited while running: ' + command)
+                line = line.decode(errors='replace').rstrip('\r\n')
+                if line.startswith(self.__marker + ' '):
+                    status = int(line[len(self.__marker) + 1:])
+                    break
+                lines.append(line)
+            if lines[-1] == '':
+                lines.pop()  # 输出以换行结尾时, 标记前的换行多出的空行
+            self.latencies.append(time.perf_counter() - begin)
+        if status != 0:
+            raise subprocess.CalledProcessError(status, command, '\n'.join(lines))
+        return '\n'.join(lines)
+
+    def mean_latency(self) -> float:
+        """Returns the mean round trip time of the recorded commands in seconds."""
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def close(self) -> None:
+        """Exit the shell."""
+        with self.__lock:
+            if self.__connection is not None:
+                try:
+                    self.__connection.file.write(b'exit\n')
+                    self.__connection.file.flush()
+                except OSError:
+                    pass
+                self.__connection.close()
+                self.__connection = None
+
+
+def shell() -> Shell:
+    """Returns the shell session of the connected device used by `tap`, `swipe` and `home`."""
+    return device().shell
 
 
 def tap(x: int, y: int) -> None:
@@ -80,7 +242,7 @@ def tap(x: int, y: int) -> None:
         `x`: The x coordinate of the tap point.
         `y`: The y coordinate of the tap point.
     """
-    os.system(__adb + ' shell input tap ' + str(x) + ' ' + str(y))
+    device().tap(x, y)
 
 
 def swipe(x1: int, y1: int, x2: int, y2: int) -> None:
@@ -92,34 +254,517 @@ def swipe(x1: int, y1: int, x2: int, y2: int) -> None:
         `x2`: The end x coordinate of the swipe.
         `y2`: The end y coordinate of the swipe.
     """
-    os.system(__adb + ' shell input swipe ' + str(x1) +
-              ' ' + str(y1) + ' ' + str(x2) + ' ' + str(y2))
+    device().swipe(x1, y1, x2, y2)
 
 
 def home() -> None:
     """Push the home botton of the connected device."""
-    os.system(__adb + ' shell input keyevent 3')
+    device().home()
+
 
+class Touch:
+    """Inject touches by writing raw multitouch events to the touchscreen event node.
 
-def __make_max() -> int and int:
-    """Get the maximum size of the coordinates.
+    Every gesture is encoded into `input_event` frames on the computer and written to
+    the event node by a single command of a `Shell`, which bypasses the slow `input`
+    command of Android. The coordinates are screen pixels in the natural orientation of
+    the touchscreen, they are scaled to the ABS units of the touchscreen with factors
+    computed once when the object is created.
+
+    Example:
+
+        touch = Touch(shell(), '/dev/input/event2', 32767, 32767, 1920, 1080)
+        touch.tap(100, 200)
+        touch.drag([((100, 500), (100, 100)), ((300, 500), (300, 100))])
+    """
+
+    EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+    SYN_REPORT, BTN_TOUCH = 0x00, 0x14a
+    ABS_MT_SLOT, ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID = 0x2f, 0x35, 0x36, 0x39
+
+    __octal = ['\\%03o' % byte for byte in range(256)]
+
+    def __init__(self, shell: Shell, node: str, max_x: int, max_y: int, width: int, height: int,
+                 wide: bool = True) -> None:
+        """Create a touch injector.
+
+        Args:
+            * `shell`: The shell session which the events are written through.
+            * `node`: The path of the touchscreen event node, i.e. `/dev/input/event2`.
+            * `max_x`: The maximum of the `ABS_MT_POSITION_X`(0035) axis.
+            * `max_y`: The maximum of the `ABS_MT_POSITION_Y`(0036) axis.
+            * `width`: The horizontal resolution of the screen.
+            * `height`: The vertical resolution of the screen.
+            * `wide`: Optional; Whether the userspace of the device is 64-bit,
+            which decides the size of `struct input_event`.
+        """
+        self.shell = shell
+        self.node = node
+        self.scale_x = max_x / width
+        self.scale_y = max_y / height
+        self.__event = struct.Struct('<qqHHi' if wide else '<llHHi')
+        self.__tracking_id = 0
+
+    @tracing.traced('touch.tap')
+    def tap(self, x: int, y: int, duration: float = 0.05) -> None:
+        """Tap the screen at the specified coordinates.
+
+        Args:
+            * `x`: The x coordinate of the tap point.
+            * `y`: The y coordinate of the tap point.
+            * `duration`: Optional; How long the finger stays on the screen in seconds.
+        """
+        self.gesture([[(x, y), (x, y)]], duration)
+
+    def long_press(self, x: int, y: int, duration: float = 1.0) -> None:
+        """Press the screen at the specified coordinates for a while.
+
+        Args:
+            * `x`: The x coordinate of the press point.
+            * `y`: The y coordinate of the press point.
+            * `duration`: Optional; How long the finger stays on the screen in seconds.
+        """
+        self.gesture([[(x, y), (x, y)]], duration)
+
+    @tracing.traced('touch.swipe')
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: float = 0.3, steps: int = 20) -> None:
+        """Swipe the screen from a point to another.
+
+        Args:
+            * `x1`: The start x coordinate of the swipe.
+            * `y1`: The start y coordinate of the swipe.
+            * `x2`: The end x coordinate of the swipe.
+            * `y2`: The end y coordinate of the swipe.
+            * `duration`: Optional; How long the swipe lasts in seconds.
+            * `steps`: Optional; How many moves the swipe is divided into.
+        """
+        self.drag([((x1, y1), (x2, y2))], duration, steps)
+
+    def drag(self, fingers: list[tuple[tuple[int, int], tuple[int, int]]], duration: float = 0.3,
+             steps: int = 20) -> None:
+        """Move several fingers along straight lines at the same time.
+
+        Args:
+            * `fingers`: The start point and the end point of every finger.
+            * `duration`: Optional; How long the drag lasts in seconds.
+            * `steps`: Optional; How many moves the drag is divided into.
+        """
+        tracks = [[(x1 + (x2 - x1) * i / steps, y1 + (y2 - y1) * i / steps) for i in range(steps + 1)]
+                  for (x1, y1), (x2, y2) in fingers]
+        self.gesture(tracks, duration / steps)
+
+    @tracing.traced('touch.gesture')
+    def gesture(self, tracks: list[list[tuple[int, int]]], interval: float) -> None:
+        """Perform a gesture described by the tracks of the fingers.
+
+        All the fingers go down at the first point of their tracks, move to the next points
+        together every `interval` seconds, and go up after the last points.
+
+        Args:
+            * `tracks`: The points every finger passes, all tracks must have the same length.
+            * `interval`: The time between two points in seconds.
+        """
+        frames = []
+        for step in range(len(tracks[0])):
+            events = []
+            for slot, track in enumerate(tracks):
+                x, y = track[step]
+                events.append((self.EV_ABS, self.ABS_MT_SLOT, slot))
+                if step == 0:
+                    self.__tracking_id += 1
+                    events.append((self.EV_ABS, self.ABS_MT_TRACKING_ID, self.__tracking_id))
+                events.append((self.EV_ABS, self.ABS_MT_POSITION_X, round(x * self.scale_x)))
+                events.append((self.EV_ABS, self.ABS_MT_POSITION_Y, round(y * self.scale_y)))
+            if step == 0:
+                events.append((self.EV_KEY, self.BTN_TOUCH, 1))
+            frames.append(events)
+        frames.append([event for slot in range(len(tracks))
+                       for event in ((self.EV_ABS, self.ABS_MT_SLOT, slot),
+                                     (self.EV_ABS, self.ABS_MT_TRACKING_ID, -1))])
+        frames[-1].append((self.EV_KEY, self.BTN_TOUCH, 0))
+        self.shell.run(self.encode(frames, interval))
+
+    def encode(self, frames: list[list[tuple[int, int, int]]], interval: float) -> str:
+        """Encode the frames into a shell command writing them to the event node.
+
+        Args:
+            * `frames`: Every frame is a list of `(type, code, value)` events,
+            a `SYN_REPORT` is appended to the end of every frame.
+            * `interval`: The time between two frames in seconds.
+
+        Returns:
+            A shell command writing the frames to the event node.
+        """
+        octal = self.__octal.__getitem__
+        writes = []
+        for events in frames:
+            data = b''.join(self.__event.pack(0, 0, *event) for event in events)
+            data += self.__event.pack(0, 0, self.EV_SYN, self.SYN_REPORT, 0)
+            writes.append("printf '" + ''.join(map(octal, data)) + "'")
+        return '{ ' + ('; sleep ' + format(interval, 'f') + '; ').join(writes) + '; } > ' + self.node
+
+
+def touch() -> Touch:
+    """Returns the touch injector of the connected device."""
+    return device().touch()
+
+
+class Screencap:
+    """Capture the screen of a device into a reusable NumPy array.
+
+    The raw RGBA output of `screencap` is streamed through the `exec:` service and read
+    straight into a preallocated buffer, no file is written on the device and no PNG is
+    encoded or decoded. Every capture overwrites the same buffer, copy the frame if it
+    is needed after the next capture.
+
+    Example:
+
+        capture = Screencap()
+        for frame in capture.stream():
+            print(frame.shape)  # (height, width, 4)
+    """
+
+    def __init__(self, serial: str = '', client: adbclient.Client = None) -> None:
+        """Create a screen capturer.
+
+        Args:
+            * `serial`: Optional; The serial number of the device, the only device if empty.
+            * `client`: Optional; The client of the adb server, a new one for `serial` if `None`.
+        """
+        self.serial = serial
+        self.client = client or adbclient.Client(serial, adb=ADB)
+        self.__frame = None
+        self.__header_size = 0
+
+    @tracing.traced('screencap')
+    def grab(self) -> numpy.ndarray:
+        """Capture a frame.
+
+        Returns:
+            A `uint8` array of shape `(height, width, 4)` holding the RGBA pixels,
+            which is reused by the next capture.
+
+        Raises:
+            ConnectionError: The output of `screencap` ended before a whole frame is read.
+        """
+        with self.client.exec('screencap') as connection:
+            stream = connection.file
+            if self.__frame is None:
+                # The header is 12 bytes before Android 9 and 16 bytes since, which has a color space.
+                data = stream.read()
+                width, height = struct.unpack_from('<II', data)
+                self.__header_size = len(data) - width * height * 4
+                self.__frame = numpy.frombuffer(bytearray(data[self.__header_size:]), numpy.uint8)
+                self.__frame = self.__frame.reshape(height, width, 4)
+                return self.__frame
+            header = stream.read(self.__header_size)
+            if struct.unpack_from('<II', header) != (self.__frame.shape[1], self.__frame.shape[0]):
+                self.__frame = None
+                stream.read()
+                return self.grab()
+            view = memoryview(self.__frame).cast('B')
+            filled = 0
+            while filled < len(view):
+                size = stream.readinto(view[filled:])
+                if not size:
+                    raise ConnectionError('screencap ended after ' + str(filled) + ' bytes')
+                filled += size
+        return self.__frame
+
+    def stream(self, interval: float = 0.0):
+        """Capture frames continuously.
+
+        Args:
+            `interval`: Optional; The minimum time between two captures in seconds.
+
+        Yields:
+            The captured frames, all of them are the same reused array.
+        """
+        while True:
+            begin = time.perf_counter()
+            yield self.grab()
+            rest = interval - (time.perf_counter() - begin)
+            if rest > 0:
+                time.sleep(rest)
+
+
+def screencap() -> numpy.ndarray:
+    """Capture the screen of the connected device.
 
     Returns:
-        The maximum size of the horizontal coordinate.
-        The maximum size of the vertical coordinate.
-    """
-    global __max0035, __max0036
-    contents = os.popen(__adb + ' shell getevent -p').read()
-    abs0003 = contents.find('ABS')
-    __max0035 = contents.find('0035', abs0003)
-    __max0035 = contents.find('max', __max0035)
-    end0035 = contents.find(',', __max0035)
-    __max0036 = contents.find('0036', abs0003)
-    __max0036 = contents.find('max', __max0036)
-    end0036 = contents.find(',', __max0036)
-    __max0035, __max0036 = int(
-        contents[__max0035 + 4: end0035]), int(contents[__max0036 + 4: end0036])
-    return __max0035, __max0036
+        A `uint8` array of shape `(height, width, 4)` holding the RGBA pixels,
+        which is reused by the next capture.
+    """
+    return device().screencap()
+
+
+class Profiles:
+    """An on-disk store of device profiles keyed by serial number.
+
+    The profiles are kept in a JSON file, which is rewritten atomically on every change.
+    A profile is only valid for the build fingerprint recorded in it, see `Device.profile`.
+    """
+
+    def __init__(self, path: str = 'data/devices.json') -> None:
+        """Create a profile store.
+
+        Args:
+            `path`: Optional; The path of the JSON file.
+        """
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__profiles = None
+
+    def get(self, serial: str) -> dict or None:
+        """Returns the profile of the device, or `None` if it is not stored."""
+        with self.__lock:
+            return self.__load().get(serial)
+
+    def put(self, serial: str, profile: dict) -> None:
+        """Store the profile of the device."""
+        with self.__lock:
+            self.__load()[serial] = profile
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.__profiles, f, ensure_ascii=False, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+
+    def __load(self) -> dict:
+        if self.__profiles is None:
+            try:
+                with open(self.path, 'rb') as f:
+                    self.__profiles = json.load(f)
+            except (OSError, ValueError):
+                self.__profiles = {}
+        return self.__profiles
+
+
+def profiles() -> Profiles:
+    """Returns the profile store shared by all the devices."""
+    global __profiles
+    if __profiles is None:
+        __profiles = Profiles()
+    return __profiles
+
+
+class Device:
+    """A device attached to adb.
+
+    Every command is sent to the device by its serial number, so that many devices can be
+    driven by one process. The resolution, density and touchscreen maxima are cached in
+    the `profile` of the device, and the commands go through the persistent `shell`.
+
+    Example:
+
+        device = Device('emulator-5554')
+        width, height = device.wm_size()
+        device.tap(width // 2, height // 2)
+    """
+
+    __arknights = 'com.hypergryph.arknights/com.u8.sdk.U8UnityContext'
+
+    def __init__(self, serial: str = '', profiles: Profiles = None) -> None:
+        """Create a device.
+
+        Args:
+            * `serial`: Optional; The serial number of the device, the only device if empty.
+            * `profiles`: Optional; The profile store, the shared `profiles()` if `None`.
+        """
+        self.serial = serial
+        self.profiles = profiles
+        self.client = adbclient.Client(serial, adb=ADB)
+        self.shell = Shell(serial, client=self.client)
+        self.__lock = threading.RLock()
+        self.__profile = None
+        self.__touch = None
+        self.__screencap = Screencap(serial, self.client)
+
+    def __repr__(self) -> str:
+        return 'Device(' + repr(self.serial) + ')'
+
+    def adb(self, *args: str) -> list[str]:
+        """Returns the adb command line running `args` on this device."""
+        return [ADB] + (['-s', self.serial] if self.serial else []) + list(args)
+
+    @tracing.traced('profile')
+    def profile(self) -> dict:
+        """Returns the profile of this device.
+
+        The profile is read from the profile store if the build fingerprint of the device is
+        unchanged, which costs a single shell round trip. Otherwise all the properties are
+        queried by a single shell round trip and saved to the store.
+
+        Returns:
+            A dict with the following keys:
+            * `fingerprint`: The build fingerprint.
+            * `size`: The horizontal and vertical resolution of the screen.
+            * `density`: The screen density.
+            * `max`: The maximum of the horizontal and vertical touchscreen coordinates.
+            * `touch_node`: The path of the touchscreen event node.
+            * `abi`: The primary ABI.
+        """
+        with self.__lock:
+            if self.__profile is None:
+                self.__profile = self.__load_profile()
+        return self.__profile
+
+    def __load_profile(self) -> dict:
+        store = self.profiles or profiles()
+        cached = store.get(self.serial)
+        if cached is not None and cached['fingerprint'] == self.shell.run('getprop ro.build.fingerprint'):
+            return cached
+        commands = ['getprop ro.build.fingerprint', 'wm size', 'wm density', 'getprop ro.product.cpu.abi',
+                    'getevent -p 2>/dev/null']  # getevent会把打不开的节点报告到stderr
+        sections = [[]]
+        for line in self.shell.run('; echo __ASH_PROFILE__; '.join(commands)).splitlines():
+            if line == '__ASH_PROFILE__':
+                sections.append([])
+            else:
+                sections[-1].append(line)
+        fingerprint, size, density, abi, getevent = ('\n'.join(section) for section in sections)
+        touch_node, max_x, max_y = self.__parse_getevent(getevent)
+        profile = {
+            'fingerprint': fingerprint,
+            'size': [int(value) for value in size.split()[2].split('x')],
+            'density': int(density.split()[2]),
+            'max': [max_x, max_y],
+            'touch_node': touch_node,
+            'abi': abi.strip(),
+        }
+        store.put(self.serial, profile)
+        return profile
+
+    def __parse_getevent(self, contents: str) -> str and int and int:
+        """Parse `getevent -p` for the touchscreen node and the maxima of the 0035 and 0036 axes."""
+        abs0003 = contents.find('ABS')
+        max0035 = contents.find('0035', abs0003)
+        node = contents.rfind('add device', 0, max0035)
+        touch_node = contents[contents.find(':', node) + 1: contents.find('\n', node)].strip()
+        max0035 = contents.find('max', max0035)
+        end0035 = contents.find(',', max0035)
+        max0036 = contents.find('0036', abs0003)
+        max0036 = contents.find('max', max0036)
+        end0036 = contents.find(',', max0036)
+        return touch_node, int(contents[max0035 + 4: end0035]), int(contents[max0036 + 4: end0036])
+
+    def wm_size(self) -> tuple[int, int]:
+        """Returns the horizontal and vertical resolution of the screen."""
+        return tuple(self.profile()['size'])
+
+    def wm_density(self) -> int:
+        """Returns the screen density."""
+        return self.profile()['density']
+
+    def get_max(self) -> tuple[int, int]:
+        """Returns the maximum of the horizontal and vertical touchscreen coordinates."""
+        return tuple(self.profile()['max'])
+
+    def touch(self) -> Touch:
+        """Returns the touch injector of this device."""
+        with self.__lock:
+            if self.__touch is None:
+                profile = self.profile()
+                self.__touch = Touch(self.shell, profile['touch_node'], *profile['max'], *profile['size'],
+                                     '64' in profile['abi'])
+        return self.__touch
+
+    def screencap(self) -> numpy.ndarray:
+        """Capture the screen, see `Screencap.grab`."""
+        return self.__screencap.grab()
+
+    @tracing.traced('start_arknights')
+    def start_arknights(self) -> None:
+        """Start Arknights."""
+        self.shell.run('am start -n ' + self.__arknights)
+
+    @tracing.traced('pull')
+    def pull(self, device_path: str, computer_path: str) -> int:
+        """Copy the file in `device_path` on the device to `computer_path` on the computer, returns its size."""
+        return self.client.pull(device_path, computer_path)
+
+    @tracing.traced('push')
+    def push(self, computer_path: str, device_path: str) -> int:
+        """Copy the file in `computer_path` on the computer to `device_path` on the device, returns its size."""
+        return self.client.push(computer_path, device_path)
+
+    @tracing.traced('pull_changed')
+    def pull_changed(self, device_path: str, computer_path: str, compare: str = 'md5') -> dict:
+        """Copy a file or a directory tree to the computer, see `adbclient.Client.pull_changed`."""
+        return self.client.pull_changed(device_path, computer_path, compare)
+
+    @tracing.traced('push_changed')
+    def push_changed(self, computer_path: str, device_path: str, compare: str = 'md5') -> dict:
+        """Copy a file or a directory tree to the device, see `adbclient.Client.push_changed`."""
+        return self.client.push_changed(computer_path, device_path, compare)
+
+    @tracing.traced('tap')
+    def tap(self, x: int, y: int) -> None:
+        """Tap the screen at the specified coordinates."""
+        self.shell.run('input tap ' + str(x) + ' ' + str(y))
+
+    @tracing.traced('swipe')
+    def swipe(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Swipe the screen from (`x1`, `y1`) to (`x2`, `y2`)."""
+        self.shell.run('input swipe ' + str(x1) + ' ' + str(y1) + ' ' + str(x2) + ' ' + str(y2))
+
+    @tracing.traced('home')
+    def home(self) -> None:
+        """Push the home button."""
+        self.shell.run('input keyevent 3')
+
+
+def online() -> list[Device]:
+    """Returns a `Device` for every attached device which is online."""
+    return [Device(line.split()[0]) for line in devices() if line.split()[1:] == ['device']]
+
+
+class Fleet:
+    """Run farming scripts on many devices concurrently.
+
+    Every device is driven by at most one worker thread at a time, and at most `workers`
+    devices are driven at the same time. Like devil's `SyncParallelizer`, calling a method
+    of `Device` on a fleet calls it on every device and waits for all of them.
+
+    Example:
+
+        fleet = Fleet()
+        fleet.start_arknights()
+        results = fleet.run(farm, '1-7', times=10)  # farm(device, '1-7', times=10)
+    """
+
+    def __init__(self, devices: list[Device] = None, workers: int = 8) -> None:
+        """Create a fleet.
+
+        Args:
+            * `devices`: Optional; The devices to drive, all the online devices if `None`.
+            * `workers`: Optional; The maximum number of devices driven at the same time.
+        """
+        if devices is None:
+            devices = online()
+        self.devices = devices
+        self.workers = workers
+
+    def run(self, script, *args, **kwargs) -> list:
+        """Run a script on every device and wait for all of them.
+
+        Args:
+            * `script`: A callable taking a `Device` as its first argument.
+            * `args`, `kwargs`: The other arguments passed to `script`.
+
+        Returns:
+            The results of `script` in the order of `devices`.
+
+        Raises:
+            The first exception raised by `script`, after all the scripts have finished.
+        """
+        with ThreadPoolExecutor(max(1, min(self.workers, len(self.devices)))) as executor:
+            futures = [executor.submit(script, device, *args, **kwargs) for device in self.devices]
+        return [future.result() for future in futures]
+
+    def __getattr__(self, name: str):
+        if not callable(getattr(Device, name, None)):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.run(getattr(Device, name), *args, **kwargs)
 
 
 def get_max_x() -> int:
@@ -128,9 +773,7 @@ def get_max_x() -> int:
     Returns:
         A int indicating the maximum size of the x coordinate.
     """
-    if __max0035 == 0:
-        __make_max()
-    return __max0035
+    return device().get_max()[0]
 
 
 def get_max_y() -> int:
@@ -139,9 +782,7 @@ def get_max_y() -> int:
     Returns:
         A int indicating the maximum size of the y coordinate.
     """
-    if __max0036 == 0:
-        __make_max()
-    return __max0036
+    return device().get_max()[1]
 
 
 def __main() -> int:
@@ -154,8 +795,9 @@ def __main() -> int:
     print('该设备ppi为为:', wm_density())
     print('0035max:', get_max_x())
     print('0036max:', get_max_y())
-    tap(random.randint(1125, 1443) * __max0035 / 1920,
-        random.randint(633, 779) * __max0036 / 1080)
+    tap(random.randint(1125, 1443) * get_max_x() / 1920,
+        random.randint(633, 779) * get_max_y() / 1080)
+    print('平均点击延迟:', round(shell().mean_latency() * 1000, 1), 'ms')
 
 
 if __name__ == '__main__':
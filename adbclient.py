@@ -0,0 +1,538 @@
+import collections
+import hashlib
+import os
+import posixpath
+import shlex
+import socket
+import stat
+import struct
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+HOST = '127.0.0.1'
+PORT = int(os.environ.get('ANDROID_ADB_SERVER_PORT', 5037))
+SYNC_DATA_MAX = 64 * 1024  # sync协议每个DATA块的最大长度
+MD5SUM_BATCH = 100  # 每条md5sum命令计算的文件数
+
+
+class Connection:
+    """A socket to the adb server speaking the smart socket protocol.
+
+    A request is its length in 4 hex digits followed by the request, and the server answers
+    `OKAY`, or `FAIL` followed by a message with its length. After a device service is opened,
+    the socket is a raw stream to the service, which is read and written through `file`.
+    """
+
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: float = None) -> None:
+        """Connect to the adb server.
+
+        Args:
+            * `host`: Optional; The host of the adb server.
+            * `port`: Optional; The port of the adb server.
+            * `timeout`: Optional; The timeout of the socket operations in seconds.
+
+        Raises:
+            ConnectionRefusedError: The adb server is not running.
+        """
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile('rwb')
+
+    def __enter__(self) -> 'Connection':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def request(self, request: str) -> None:
+        """Send a request and wait for `OKAY`.
+
+        Raises:
+            ConnectionError: The server answered `FAIL` or closed the socket.
+        """
+        data = request.encode()
+        self.file.write(b'%04x' % len(data) + data)
+        self.file.flush()
+        self.status(request)
+
+    def status(self, request: str = '') -> None:
+        """Read the `OKAY` or `FAIL` answering a request.
+
+        Raises:
+            ConnectionError: The server answered `FAIL` or closed the socket.
+        """
+        status = self.read(4)
+        if status == b'FAIL':
+            raise ConnectionError(request + ': ' + self.read_string())
+        if status != b'OKAY':
+            raise ConnectionError(request + ': unexpected status ' + repr(status))
+
+    def read(self, size: int = -1) -> bytes:
+        """Read exactly `size` bytes, or everything until the socket is closed if `size` is negative.
+
+        Raises:
+            ConnectionError: The socket is closed before `size` bytes are read.
+        """
+        data = self.file.read(size)
+        if size >= 0 and len(data) != size:
+            raise ConnectionError('adb server closed the connection after ' + str(len(data)) + ' bytes')
+        return data
+
+    def read_string(self) -> str:
+        """Read a string prefixed by its length in 4 hex digits."""
+        return self.read(int(self.read(4), 16)).decode(errors='replace')
+
+    def close(self) -> None:
+        """Close the socket."""
+        try:
+            self.file.close()
+        finally:
+            self.socket.close()
+
+
+class SyncSession:
+    """A session of the file sync protocol on a device.
+
+    Every request is a 4 byte id and a little-endian 32-bit length followed by the data, so one
+    session serves any number of `stat`, `list`, `pull` and `push`.
+    """
+
+    def __init__(self, connection: Connection) -> None:
+        """Create a session on a connection whose `sync:` service has been opened."""
+        self.connection = connection
+
+    def __send(self, id: bytes, data: bytes = b'', length: int = None) -> None:
+        self.connection.file.write(struct.pack('<4sI', id, len(data) if length is None else length) + data)
+
+    def __receive(self) -> tuple[bytes, int]:
+        return struct.unpack('<4sI', self.connection.read(8))
+
+    def __fail(self, path: str, length: int):
+        return ConnectionError(path + ': ' + self.connection.read(length).decode(errors='replace'))
+
+    def stat(self, path: str) -> tuple[int, int, int]:
+        """Returns the mode, size and modification time of a file on the device, all 0 if it does not exist."""
+        self.__send(b'STAT', path.encode())
+        self.connection.file.flush()
+        id, mode, size, mtime = struct.unpack('<4sIII', self.connection.read(16))
+        if id != b'STAT':
+            raise ConnectionError(path + ': unexpected sync response ' + repr(id))
+        return mode, size, mtime
+
+    def list(self, path: str) -> list[tuple[str, int, int, int]]:
+        """Returns the name, mode, size and modification time of every entry of a directory on the device."""
+        self.__send(b'LIST', path.encode())
+        self.connection.file.flush()
+        entries = []
+        while True:
+            id, mode, size, mtime, length = struct.unpack('<4sIIII', self.connection.read(20))
+            if id == b'DONE':
+                return entries
+            if id != b'DENT':
+                raise ConnectionError(path + ': unexpected sync response ' + repr(id))
+            name = self.connection.read(length).decode(errors='surrogateescape')
+            if name not in ('.', '..'):
+                entries.append((name, mode, size, mtime))
+
+    def walk(self, path: str) -> dict[str:tuple[int, int, int]]:
+        """Returns the mode, size and modification time of every regular file under a path on the device.
+
+        Args:
+            `path`: The path of a file or a directory on the device.
+
+        Returns:
+            A dict whose `key` is the path of a file relative to `path`, or `''` if `path` is a file.
+        """
+        mode, size, mtime = self.stat(path)
+        if stat.S_ISREG(mode):
+            return {'': (mode, size, mtime)}
+        files, directories = {}, [''] if stat.S_ISDIR(mode) else []
+        while directories:
+            directory = directories.pop()
+            for name, mode, size, mtime in self.list(posixpath.join(path, directory)):
+                relative = posixpath.join(directory, name)
+                if stat.S_ISDIR(mode):
+                    directories.append(relative)
+                elif stat.S_ISREG(mode):
+                    files[relative] = (mode, size, mtime)
+        return files
+
+    def receive(self, path: str, file) -> int:
+        """Copy a file on the device into a file object.
+
+        Args:
+            * `path`: The path of the file on the device.
+            * `file`: A binary file object the content is written to.
+
+        Returns:
+            The size of the file.
+
+        Raises:
+            ConnectionError: The device failed to read the file.
+        """
+        self.__send(b'RECV', path.encode())
+        self.connection.file.flush()
+        total = 0
+        while True:
+            id, length = self.__receive()
+            if id == b'DONE':
+                return total
+            if id == b'FAIL':
+                raise self.__fail(path, length)
+            if id != b'DATA':
+                raise ConnectionError(path + ': unexpected sync response ' + repr(id))
+            file.write(self.connection.read(length))
+            total += length
+
+    def send(self, file, path: str, mode: int = 0o644, mtime: int = None) -> int:
+        """Copy a file object into a file on the device.
+
+        Args:
+            * `file`: A binary file object the content is read from.
+            * `path`: The path of the file on the device.
+            * `mode`: Optional; The permission bits of the file.
+            * `mtime`: Optional; The modification time of the file, now if `None`.
+
+        Returns:
+            The size of the file.
+
+        Raises:
+            ConnectionError: The device failed to write the file.
+        """
+        self.__send(b'SEND', (path + ',' + str(stat.S_IFREG | mode & 0o7777)).encode())
+        total = 0
+        while True:
+            chunk = file.read(SYNC_DATA_MAX)
+            if not chunk:
+                break
+            self.__send(b'DATA', chunk)
+            total += len(chunk)
+        self.__send(b'DONE', length=int(time.time() if mtime is None else mtime))
+        self.connection.file.flush()
+        id, length = self.__receive()
+        if id == b'FAIL':
+            raise self.__fail(path, length)
+        if id != b'OKAY':
+            raise ConnectionError(path + ': unexpected sync response ' + repr(id))
+        return total
+
+    def pull(self, device_path: str, computer_path: str) -> int:
+        """Copy the file in `device_path` on the device to `computer_path` on the computer, returns its size.
+
+        If `computer_path` is a directory, the file is copied into it under the same name.
+        """
+        if os.path.isdir(computer_path):
+            computer_path = os.path.join(computer_path, posixpath.basename(device_path.rstrip('/')))
+        try:
+            with open(computer_path + '.tmp', 'wb') as f:
+                size = self.receive(device_path, f)
+        except BaseException:
+            os.remove(computer_path + '.tmp')
+            raise
+        os.replace(computer_path + '.tmp', computer_path)
+        return size
+
+    def push(self, computer_path: str, device_path: str) -> int:
+        """Copy the file in `computer_path` on the computer to `device_path` on the device, returns its size.
+
+        If `device_path` ends with `/` or is a directory on the device, the file is copied into it
+        under the same name.
+        """
+        if device_path.endswith('/') or stat.S_ISDIR(self.stat(device_path)[0]):
+            device_path = posixpath.join(device_path, os.path.basename(computer_path))
+        with open(computer_path, 'rb') as f:
+            status = os.fstat(f.fileno())
+            return self.send(f, device_path, status.st_mode, int(status.st_mtime))
+
+    def close(self) -> None:
+        """End the session and close the connection."""
+        try:
+            self.__send(b'QUIT')
+            self.connection.file.flush()
+        except OSError:
+            pass
+        self.connection.close()
+
+
+class Client:
+    """A client of the adb server talking its wire protocol on a socket.
+
+    Host services like `host:devices` are answered by the server itself. Device services like
+    `shell:`, `exec:` and `sync:` are opened on a socket switched to the device by
+    `host:transport`, so a command costs a socket round trip to the server instead of an `adb`
+    process. The sync sessions are pooled and reused between transfers.
+
+    Example:
+
+        client = Client('emulator-5554')
+        client.devices()  # ['emulator-5554\\tdevice']
+        client.shell('input tap 100 200')
+        client.pull('/sdcard/screen.png', 'screen.png')
+    """
+
+    def __init__(self, serial: str = '', host: str = HOST, port: int = None, adb: str = None,
+                 pool_size: int = 4, timeout: float = None) -> None:
+        """Create a client, no connection is made until a service is used.
+
+        Args:
+            * `serial`: Optional; The serial number of the device, the only device if empty.
+            * `host`: Optional; The host of the adb server.
+            * `port`: Optional; The port of the adb server, `PORT` if `None`.
+            * `adb`: Optional; The path of the `adb` executable, which is run once to start the
+            server if it is not running, or `None` not to start it.
+            * `pool_size`: Optional; How many idle sync sessions are kept.
+            * `timeout`: Optional; The timeout of the socket operations in seconds.
+        """
+        self.serial = serial
+        self.host = host
+        self.port = port or PORT
+        self.adb = adb
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.__pool = collections.deque()
+        self.__lock = threading.Lock()
+
+    @tracing.traced('connect')
+    def connect(self) -> Connection:
+        """Returns a new connection to the adb server, starting the server if needed."""
+        try:
+            return Connection(self.host, self.port, self.timeout)
+        except ConnectionRefusedError:
+            if self.adb is None:
+                raise
+            subprocess.run([self.adb, '-P', str(self.port), 'start-server'], check=True)
+            return Connection(self.host, self.port, self.timeout)
+
+    def host_service(self, request: str) -> str:
+        """Returns the answer of a host service like `host:version`."""
+        with self.connect() as connection:
+            connection.request(request)
+            return connection.read_string()
+
+    def devices(self) -> list[str]:
+        """Returns a line of the serial number and the state for every attached device."""
+        return self.host_service('host:devices').splitlines()
+
+    @tracing.traced('open')
+    def open(self, service: str) -> Connection:
+        """Open a service on the device.
+
+        Args:
+            `service`: The service, i.e. `'shell:ls'` or `'sync:'`.
+
+        Returns:
+            The connection streaming the service, which must be closed by the caller.
+        """
+        connection = self.connect()
+        try:
+            connection.request('host:transport:' + self.serial if self.serial else 'host:transport-any')
+            connection.request(service)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def shell(self, command: str) -> str:
+        """Run a shell command on the device and returns its output."""
+        with self.open('shell:' + command) as connection:
+            return connection.read().decode(errors='replace')
+
+    def exec(self, command: str) -> Connection:
+        """Run a command on the device with a raw binary stream and returns its connection."""
+        return self.open('exec:' + command)
+
+    @contextmanager
+    def sync(self):
+        """Borrow a sync session from the pool, a session failing in the block is not returned to it.
+
+        Yields:
+            A `SyncSession`.
+        """
+        with self.__lock:
+            session = self.__pool.pop() if self.__pool else None
+        if session is None:
+            session = SyncSession(self.open('sync:'))
+        try:
+            yield session
+        except BaseException:
+            session.close()
+            raise
+        with self.__lock:
+            if len(self.__pool) < self.pool_size:
+                self.__pool.append(session)
+                session = None
+        if session is not None:
+            session.close()
+
+    def pull(self, device_path: str, computer_path: str) -> int:
+        """Copy the file in `device_path` on the device to `computer_path` on the computer, returns its size."""
+        with self.sync() as session:
+            return session.pull(device_path, computer_path)
+
+    def push(self, computer_path: str, device_path: str) -> int:
+        """Copy the file in `computer_path` on the computer to `device_path` on the device, returns its size."""
+        with self.sync() as session:
+            return session.push(computer_path, device_path)
+
+    def md5sum(self, paths: list[str]) -> dict[str:str]:
+        """Returns the MD5 of files on the device by `md5sum`, a missing file is left out."""
+        digests = {}
+        for begin in range(0, len(paths), MD5SUM_BATCH):
+            command = 'md5sum ' + ' '.join(shlex.quote(path) for path in paths[begin:begin + MD5SUM_BATCH])
+            for line in self.shell(command + ' 2>/dev/null').splitlines():
+                digest, _, path = line.partition('  ')
+                if len(digest) == 32:
+                    digests[path] = digest
+        return digests
+
+    def push_changed(self, computer_path: str, device_path: str, compare: str = 'md5') -> dict:
+        """Copy a file or a directory tree on the computer to the device, skipping the unchanged files.
+
+        All the files are listed and copied over one sync session. A file is copied if it is
+        missing on the device or its size differs, and a file of the same size is compared by
+        `compare`, like `DeviceUtils.PushChangedFiles` of devil.
+
+        Args:
+            * `computer_path`: The path of a file or a directory on the computer.
+            * `device_path`: The path it is copied to on the device, a file is copied into it under
+            the same name if it ends with `/` or is a directory, like `push`.
+            * `compare`: Optional; How the files of the same size are compared:
+                * `'md5'`: By the MD5 of the files, computed by `md5sum` on the device.
+                * `'mtime'`: By the modification time, which `push` keeps.
+                * `'size'`: Not compared, the files of the same size are skipped.
+
+        Returns:
+            The transfer, see `transfer_report`.
+        """
+        begin = time.perf_counter()
+        if os.path.isdir(computer_path):
+            pairs = [(os.path.join(root, name), os.path.relpath(os.path.join(root, name), computer_path).replace(os.sep, '/'))
+                     for root, _, names in os.walk(computer_path) for name in names]
+        else:
+            pairs = [(computer_path, '')]
+        total = 0
+        with self.sync() as session:
+            if not os.path.isdir(computer_path) and (device_path.endswith('/')
+                                                     or stat.S_ISDIR(session.stat(device_path)[0])):
+                device_path = posixpath.join(device_path, os.path.basename(computer_path))
+            remote = session.walk(device_path)
+            changed, same_size = [], []
+            for local, relative in pairs:
+                status = os.stat(local)
+                mode, size, mtime = remote.get(relative, (0, -1, 0))
+                if size != status.st_size or compare == 'mtime' and mtime != int(status.st_mtime):
+                    changed.append((local, relative))
+                elif compare == 'md5':
+                    same_size.append((local, relative))
+            if same_size:
+                digests = self.md5sum([join(device_path, relative) for _, relative in same_size])
+                changed += [(local, relative) for local, relative in same_size
+                            if digests.get(join(device_path, relative)) != file_md5(local)]
+            for local, relative in changed:
+                # The destinations are known to be files, `send` saves the `stat` of `push`.
+                with open(local, 'rb') as f:
+                    status = os.fstat(f.fileno())
+                    total += session.send(f, join(device_path, relative), status.st_mode, int(status.st_mtime))
+        return transfer_report(len(pairs), len(changed), total, time.perf_counter() - begin)
+
+    def pull_changed(self, device_path: str, computer_path: str, compare: str = 'md5') -> dict:
+        """Copy a file or a directory tree on the device to the computer, skipping the unchanged files.
+
+        All the files are listed and copied over one sync session, and the copies keep the
+        modification times of the device. The files are compared like `push_changed`.
+
+        Args:
+            * `device_path`: The path of a file or a directory on the device.
+            * `computer_path`: The path it is copied to on the computer, a file is copied into it under
+            the same name if it is a directory, like `pull`.
+            * `compare`: Optional; How the files of the same size are compared, see `push_changed`.
+
+        Returns:
+            The transfer, see `transfer_report`.
+
+        Raises:
+            FileNotFoundError: `device_path` does not exist on the device.
+        """
+        begin = time.perf_counter()
+        total = 0
+        with self.sync() as session:
+            remote = session.walk(device_path)
+            if not remote and not stat.S_ISDIR(session.stat(device_path)[0]):
+                raise FileNotFoundError(device_path)
+            if '' in remote and os.path.isdir(computer_path):
+                computer_path = os.path.join(computer_path, posixpath.basename(device_path.rstrip('/')))
+            changed, same_size = [], []
+            for relative, (mode, size, mtime) in remote.items():
+                local = join(computer_path, relative, os.sep)
+                try:
+                    status = os.stat(local)
+                except FileNotFoundError:
+                    changed.append(relative)
+                    continue
+                if size != status.st_size or compare == 'mtime' and mtime != int(status.st_mtime):
+                    changed.append(relative)
+                elif compare == 'md5':
+                    same_size.append(relative)
+            if same_size:
+                digests = self.md5sum([join(device_path, relative) for relative in same_size])
+                changed += [relative for relative in same_size
+                            if digests.get(join(device_path, relative)) != file_md5(join(computer_path, relative, os.sep))]
+            for relative in changed:
+                local = join(computer_path, relative, os.sep)
+                os.makedirs(os.path.dirname(local) or '.', exist_ok=True)
+                total += session.pull(join(device_path, relative), local)
+                os.utime(local, (remote[relative][2], remote[relative][2]))
+        return transfer_report(len(remote), len(changed), total, time.perf_counter() - begin)
+
+    def close(self) -> None:
+        """Close the pooled sync sessions."""
+        with self.__lock:
+            sessions, self.__pool = list(self.__pool), collections.deque()
+        for session in sessions:
+            session.close()
+
+
+def join(base: str, relative: str, separator: str = '/') -> str:
+    """Returns a path relative to `base` with `/` as separators, `base` itself if `relative` is empty."""
+    return base.rstrip(separator) + separator + relative.replace('/', separator) if relative else base
+
+
+def file_md5(path: str) -> str:
+    """Returns the MD5 of a file on the computer in hex."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def transfer_report(files: int, copied: int, total: int, seconds: float) -> dict:
+    """Returns the report of a transfer.
+
+    Returns:
+        A dict with the following keys:
+        * `files`: How many files there are.
+        * `copied`: How many files are copied.
+        * `skipped`: How many files are skipped as unchanged.
+        * `bytes`: How many bytes are copied.
+        * `seconds`: How long the transfer takes.
+        * `rate`: The bytes copied per second.
+    """
+    return {'files': files, 'copied': copied, 'skipped': files - copied, 'bytes': total,
+            'seconds': seconds, 'rate': total / seconds if seconds > 0 else 0.0}
+
+
+def __main() -> int:
+    client = Client()
+    print('adb server版本:', int(client.host_service('host:version'), 16))
+    for line in client.devices():
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
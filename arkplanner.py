@@ -1,10 +1,30 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy
 import requests
+from scipy import optimize, sparse
+from scipy.sparse import linalg
+
+import gametables
+
+PLANNER_URL = 'https://planner.penguin-stats.io/plan'
+__planners = {}  # 本地规划器缓存, key为(服务器, 数据版本, 掉率矩阵版本), value为对应的LocalPlanner
+__lock = threading.Lock()
 
 
 def get_plan(owned: dict[str:int] = {}, required: dict[str:int] = {}, extra_outc: bool = False, convertion_dr: float = 0,
              exp_demand: bool or int = True, gold_demand: bool or int = True, exclude: list[str] = [], store: bool = False,
-             input_lang: str = 'zh', output_lang: str = 'zh', server: str = 'CN') -> dict[str:int or list[dict[str:str]]]:
+             input_lang: str = 'zh', output_lang: str = 'zh', server: str = 'CN',
+             cache: 'PlanCache' = None, url: str = PLANNER_URL,
+             session: requests.Session = None) -> dict[str:int or list[dict[str:str]]]:
     """Get the plan for a given set of resources
 
     Args:
@@ -26,6 +46,9 @@ def get_plan(owned: dict[str:int] = {}, required: dict[str:int] = {}, extra_outc
         * `input_lang`: Optional; The language of the input. Available languages: `['zh', 'en', 'ja', 'ko'], and 'id' for item ids.
         * `output_lang`: Optional; The language of the output. Available languages: `['zh', 'en', 'ja', 'ko'], and 'id' for item ids.
         * `server`: Optional; Using active stages from this server. Available Servers: ['CN', 'US', 'JP', 'KR'].
+        * `cache`: Optional; The `PlanCache` the plan is looked up in and stored to.
+        * `url`: Optional; The URL of the planner.
+        * `session`: Optional; The session the request is sent by, a new connection is opened if `None`.
 
     Returns:
         A dict mapping the cost, gold cost, exp, planned stages, syntheses and item values.
@@ -53,8 +76,8 @@ def get_plan(owned: dict[str:int] = {}, required: dict[str:int] = {}, extra_outc
 
         Raises:
             SSLError:HTTPSConnectionPool: Max retries exceeded with url
+            HTTPError: The planner answered with an error status.
     """
-    url = 'https://planner.penguin-stats.io/plan'
     post_data = {
         'owned': owned,
         'required': required,
@@ -68,11 +91,527 @@ def get_plan(owned: dict[str:int] = {}, required: dict[str:int] = {}, extra_outc
         'output_lang': output_lang,
         'server': server,
     }
-    with closing(requests.post(url, json=post_data)) as response:
+    if cache is not None:
+        key = cache.key(post_data)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    with closing((session or requests).post(url, json=post_data)) as response:
+        response.raise_for_status()
         result = response.json()
+    if cache is not None:
+        cache.put(key, result)
     return result
 
 
+def get_plans(batch: list[dict], workers: int = 8, cache: 'PlanCache' = None,
+              url: str = PLANNER_URL) -> list[dict or Exception]:
+    """Get the plans of many sets of resources concurrently.
+
+    The requests are sent by at most `workers` threads over one pooled keep-alive session, so
+    the connections are reused across the plans instead of being opened for every plan.
+
+    Args:
+        * `batch`: A list of dicts of the arguments of `get_plan`, i.e. `[{'required': {'D32钢': 1}}]`.
+        * `workers`: Optional; The maximum number of concurrent requests.
+        * `cache`: Optional; The `PlanCache` the plans are looked up in and stored to.
+        * `url`: Optional; The URL of the planner.
+
+    Returns:
+        The plans in the order of `batch`, where a plan whose request raised, i.e. answered with an
+        error status, is replaced by the exception.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def plan(arguments: dict) -> dict or Exception:
+        try:
+            return get_plan(**arguments, cache=cache, url=url, session=session)
+        except Exception as e:
+            return e
+
+    with session, ThreadPoolExecutor(max(1, workers)) as executor:
+        return list(executor.map(plan, batch))
+
+
+class PlanCache:
+    """A memoization of plans keyed by their arguments and the data they are made from.
+
+    The key is a hash of the canonical JSON of the arguments, the version of the local game tables
+    and the version of the local drop matrix, so that a plan is never reused after the data changes.
+    Plans are kept in an in-memory LRU tier and optionally in an on-disk tier, both of which evict
+    the plans older than `ttl` and the least recently used plans beyond their sizes. The plans are
+    copied in and out, so a caller changing a plan does not change the cached one.
+
+    Example:
+
+        cache = PlanCache(directory='data/plans/')
+        get_plan(required={'D32钢': 1}, cache=cache)
+        get_plan(required={'D32钢': 1}, cache=cache)  # a hit
+        print(cache.hits, cache.misses)
+    """
+
+    def __init__(self, size: int = 256, ttl: float = 3600, directory: str = None, disk_size: int = 4096) -> None:
+        """Create a plan cache.
+
+        Args:
+            * `size`: Optional; The maximum number of plans kept in memory.
+            * `ttl`: Optional; How long a plan is valid in seconds.
+            * `directory`: Optional; The directory of the on-disk tier, no on-disk tier if `None`.
+            * `disk_size`: Optional; The maximum number of plans kept on disk.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.directory = directory
+        self.disk_size = disk_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.__memory = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def key(self, post_data: dict) -> str:
+        """Returns the key of the plan of the arguments."""
+        versions = []
+        for version in (gametables.data_version, lambda: matrix_version(post_data.get('server', 'CN'))):
+            try:
+                versions.append(version())
+            except FileNotFoundError:
+                versions.append('')
+        canonical = json.dumps([post_data, versions], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> dict or None:
+        """Returns a copy of the plan of the key, or `None` if it is not cached or has expired."""
+        now = time.time()
+        with self.__lock:
+            if key in self.__memory:
+                expires, result = self.__memory[key]
+                if expires > now:
+                    self.__memory.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(result)
+                del self.__memory[key]
+            if self.directory is not None:
+                path = os.path.join(self.directory, key + '.json')
+                try:
+                    with open(path, 'rb') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    entry = None
+                if entry is not None and entry['expires'] > now:
+                    os.utime(path)
+                    self.__remember(key, entry['expires'], copy.deepcopy(entry['result']))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return entry['result']
+                if entry is not None:
+                    os.remove(path)
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: dict) -> None:
+        """Store a copy of the plan of the key."""
+        expires = time.time() + self.ttl
+        with self.__lock:
+            self.__remember(key, expires, copy.deepcopy(result))
+            if self.directory is None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, key + '.json')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'expires': expires, 'result': result}, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+            entries = sorted(os.scandir(self.directory), key=lambda entry: entry.stat().st_mtime)
+            entries = [entry for entry in entries if entry.name.endswith('.json')]
+            for entry in entries[:max(0, len(entries) - self.disk_size)]:
+                os.remove(entry.path)
+
+    def clear(self) -> None:
+        """Remove all the plans from both tiers."""
+        with self.__lock:
+            self.__memory.clear()
+            if self.directory is not None and os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.json'):
+                        os.remove(entry.path)
+
+    def __remember(self, key: str, expires: float, result: dict) -> None:
+        self.__memory[key] = expires, result
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.size:
+            self.__memory.popitem(last=False)
+
+
+def update_matrix(server: str = 'CN') -> None:
+    """Download the drop matrix of the open stages from the Penguin Stats.
+
+    Args:
+        `server`: Optional; The server of the drop matrix. Available Servers: ['CN', 'US', 'JP', 'KR'].
+
+    Raises:
+        SSLError:HTTPSConnectionPool: Max retries exceeded with url
+    """
+    url = 'https://penguin-stats.io/PenguinStats/api/v2/result/matrix'
+    with closing(requests.get(url, params={'server': server})) as response:
+        response.raise_for_status()
+        content = response.content
+    path = 'data/matrix_' + server + '.json'
+    os.makedirs('data/', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+
+def matrix_version(server: str = 'CN') -> str:
+    """Returns the version of the local drop matrix, which changes whenever it is downloaded.
+
+    Raises:
+        FileNotFoundError: The drop matrix has never been downloaded by `update_matrix`.
+    """
+    stat = os.stat('data/matrix_' + server + '.json')
+    return str(stat.st_mtime_ns) + '-' + str(stat.st_size)
+
+
+class LocalPlanner:
+    """A planner solving the plans locally by linear programming.
+
+    The plan minimizes the sanity spent on stages, such that the drops of the stages plus the
+    syntheses by the workshop formulas cover the required items. The constraint matrix, whose
+    rows are items and whose columns are stages and formulas, is built once when the planner
+    is created, and a plan only changes the bounds and the right-hand side. The LMD spent by
+    the syntheses is taken from the LMD row, so a required amount of LMD covers it too.
+    """
+
+    __exp = {'2001': 200, '2002': 400, '2003': 1000, '2004': 2000}  # 作战记录提供的经验
+    __gold_per_sanity = 12  # 每点理智获得的龙门币
+    __gold_allowance = 1e9  # 不需求龙门币时, 合成消耗的龙门币从这笔额度中支付
+
+    def __init__(self, server: str = 'CN', min_times: int = 100) -> None:
+        """Build a planner from the local tables and drop matrix.
+
+        Args:
+            * `server`: Optional; The server of the drop matrix. Available Servers: ['CN', 'US', 'JP', 'KR'].
+            * `min_times`: Optional; The minimum number of samples for a drop rate to be used.
+
+        Raises:
+            FileNotFoundError: The drop matrix has never been downloaded by `update_matrix`.
+        """
+        with open('data/matrix_' + server + '.json', 'rb') as f:
+            matrix = json.load(f)['matrix']
+        rates = {}
+        for record in matrix:
+            stage = record['stageId']
+            if record['times'] >= min_times and gametables.cost_table.get(stage, 0) > 0 \
+                    and stage in gametables.find_stage_code:
+                rates.setdefault(stage, {})[record['itemId']] = record['quantity'] / record['times']
+
+        self.stages = sorted(rates)
+        self.formulas = sorted(gametables.formula_table)
+        items = set(self.formulas)
+        for drops in rates.values():
+            items.update(drops)
+        for costs in gametables.formula_table.values():
+            items.update(costs)
+        self.items = sorted(items) + ['exp', 'gold']
+        self.index = {item: i for i, item in enumerate(self.items)}
+
+        rows, columns, data = [], [], []
+        for column, stage in enumerate(self.stages):
+            for item, rate in rates[stage].items():
+                rows.append(self.index[item])
+                columns.append(column)
+                data.append(rate)
+                if item in self.__exp:
+                    rows.append(self.index['exp'])
+                    columns.append(column)
+                    data.append(rate * self.__exp[item])
+            rows.append(self.index['gold'])
+            columns.append(column)
+            data.append(self.__gold_per_sanity * gametables.cost_table[stage])
+        for column, item in enumerate(self.formulas, len(self.stages)):
+            rows.append(self.index[item])
+            columns.append(column)
+            data.append(1)
+            for material, count in gametables.formula_table[item].items():
+                rows.append(self.index[material])
+                columns.append(column)
+                data.append(-count)
+            rows.append(self.index['gold'])
+            columns.append(column)
+            data.append(-gametables.formula_gold_table.get(item, 0))
+        self.matrix = sparse.csr_matrix((data, (rows, columns)),
+                                        shape=(len(self.items), len(self.stages) + len(self.formulas)))
+        self.cost = numpy.concatenate([[gametables.cost_table[stage] for stage in self.stages],
+                                       numpy.zeros(len(self.formulas))])
+        self.gold_cost = numpy.array([gametables.formula_gold_table.get(item, 0) for item in self.formulas])
+
+    def demand(self, owned: dict[str:int], required: dict[str:int], exp_demand: bool or int, gold_demand: bool or int,
+               input_lang: str) -> numpy.ndarray:
+        """Returns the net demand of every item, which is the right-hand side of the constraints.
+
+        An amount of EXP or LMD is required like an item, and the LMD spent by the syntheses is
+        required on top of it. If LMD is not required, the syntheses are paid from an allowance,
+        so they are free as online. Valuing EXP and LMD by a requirement of `1e9`, which `True`
+        means online, is not modelled: every stage yields LMD in proportion to its sanity here, so
+        such a requirement would make every stage free at the margin. `True` is treated like
+        `False`, i.e. nothing is required. The owned items that are neither dropped nor used by a
+        formula, i.e. chips or furniture parts, are ignored as online.
+
+        Raises:
+            KeyError: A required item is unknown.
+        """
+        demand = numpy.zeros(len(self.items))
+        for item, count in required.items():
+            demand[self.index[self.__item_id(item, input_lang)]] += count
+        for item, count in owned.items():
+            try:
+                row = self.index[self.__item_id(item, input_lang)]
+            except KeyError:
+                continue
+            demand[row] -= count
+        for item, value in (('exp', exp_demand), ('gold', gold_demand)):
+            if not isinstance(value, bool):
+                demand[self.index[item]] += value
+        if isinstance(gold_demand, bool):
+            demand[self.index['gold']] -= self.__gold_allowance
+        return demand
+
+    def bounds(self, exclude: list[str]) -> list[tuple]:
+        """Returns the bounds of the variables, the excluded stages are bounded to zero runs."""
+        excluded = {gametables.stage_table.get(code, code) for code in exclude}
+        return [(0, 0) if stage in excluded else (0, None) for stage in self.stages] + [(0, None)] * len(self.formulas)
+
+    def plan(self, owned: dict[str:int] = {}, required: dict[str:int] = {}, extra_outc: bool = False,
+             convertion_dr: float = 0, exp_demand: bool or int = True, gold_demand: bool or int = True,
+             exclude: list[str] = [], store: bool = False, input_lang: str = 'zh',
+             output_lang: str = 'zh') -> dict[str:int or list[dict[str:str]]]:
+        """Get the plan for a given set of resources, see `get_plan` for the arguments and the result.
+
+        Only the languages `'zh'` and `'id'` are available, the extra outcome of syntheses, the
+        store values and `True` for `exp_demand` and `gold_demand` are not modelled, see `demand`.
+
+        Raises:
+            KeyError: An item or a stage is unknown.
+            ValueError: The required items cannot be obtained.
+        """
+        demand = self.demand(owned, required, exp_demand, gold_demand, input_lang)
+        result = optimize.linprog(self.cost, A_ub=-self.matrix, b_ub=-demand, bounds=self.bounds(exclude),
+                                  method='highs')
+        if result.status != 0:
+            raise ValueError('no plan is found: ' + result.message)
+        return self.format(result.x, -result.ineqlin.marginals, output_lang)
+
+    def format(self, solution: numpy.ndarray, values: numpy.ndarray, output_lang: str) -> dict:
+        """Turn the runs and syntheses of a solution and the values of items into the result of `get_plan`."""
+        def name(item: str) -> str:
+            return item if output_lang == 'id' else gametables.find_item_name.get(item, item)
+
+        def number(value: float) -> str:
+            return ('%.1f' % value).rstrip('0').rstrip('.')
+
+        runs, syntheses = solution[:len(self.stages)], solution[len(self.stages):]
+        produced = self.matrix[:, :len(self.stages)] @ runs
+        result = {
+            'cost': int(round(self.cost @ solution)),
+            'gcost': int(round(self.gold_cost @ syntheses)),
+            'gold': int(round(produced[self.index['gold']])),
+            'exp': int(round(produced[self.index['exp']])),
+            'stages': [],
+            'syntheses': [],
+            'values': [],
+        }
+        for column in numpy.flatnonzero(runs > 1e-6):
+            column_drops = self.matrix[:, column].tocoo()
+            result['stages'].append({
+                'stage': gametables.find_stage_code[self.stages[column]],
+                'count': number(runs[column]),
+                'items': {name(self.items[row]): number(rate)
+                          for row, rate in zip(column_drops.row, column_drops.data)
+                          if self.items[row] not in ('exp', 'gold')},
+            })
+        for column in numpy.flatnonzero(syntheses > 1e-6):
+            item = self.formulas[column]
+            result['syntheses'].append({
+                'target': name(item),
+                'count': number(syntheses[column]),
+                'materials': {name(material): number(count * syntheses[column])
+                              for material, count in gametables.formula_table[item].items()},
+            })
+        levels = {}
+        for item, value in zip(self.items, values):
+            rarity = gametables.rarity_table.get(gametables.find_item_name.get(item))
+            if rarity is not None:
+                levels.setdefault(rarity + 1, []).append({'name': name(item), 'value': number(value)})
+        result['values'] = [{'level': str(level), 'items': levels[level]} for level in sorted(levels, reverse=True)]
+        return result
+
+    def __item_id(self, item: str, input_lang: str) -> str:
+        if input_lang == 'id':
+            return item
+        if input_lang == 'zh':
+            return gametables.item_table[item]
+        raise ValueError('only the languages zh and id are available offline: ' + input_lang)
+
+
+def local_planner(server: str = 'CN') -> LocalPlanner:
+    """Returns the local planner of the server, which is built once per data version and drop matrix."""
+    key = server, gametables.data_version(), matrix_version(server)
+    with __lock:
+        if key not in __planners:
+            __planners[key] = LocalPlanner(server)
+        return __planners[key]
+
+
+def get_local_plan(owned: dict[str:int] = {}, required: dict[str:int] = {}, extra_outc: bool = False,
+                   convertion_dr: float = 0, exp_demand: bool or int = True, gold_demand: bool or int = True,
+                   exclude: list[str] = [], store: bool = False, input_lang: str = 'zh', output_lang: str = 'zh',
+                   server: str = 'CN', cache: PlanCache = None) -> dict[str:int or list[dict[str:str]]]:
+    """Get the plan for a given set of resources without the network.
+
+    A drop-in replacement of `get_plan` solved by `LocalPlanner` from the local tables and the drop
+    matrix downloaded by `update_matrix`. Only the languages `'zh'` and `'id'` are available, the
+    extra outcome of syntheses and the store values are not modelled.
+
+    Raises:
+        FileNotFoundError: The drop matrix has never been downloaded by `update_matrix`.
+        KeyError: An item or a stage is unknown.
+        ValueError: The required items cannot be obtained.
+    """
+    if cache is not None:
+        key = cache.key({
+            'owned': owned, 'required': required, 'extra_outc': extra_outc, 'convertion_dr': convertion_dr,
+            'exp_demand': exp_demand, 'gold_demand': gold_demand, 'exclude': exclude, 'store': store,
+            'input_lang': input_lang, 'output_lang': output_lang, 'server': server, 'local': True,
+        })
+        result = cache.get(key)
+        if result is not None:
+            return result
+    result = local_planner(server).plan(owned, required, extra_outc, convertion_dr, exp_demand, gold_demand,
+                                        exclude, store, input_lang, output_lang)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+class PlannerSession:
+    """A planning session re-solving incrementally when the owned, required or excluded change.
+
+    The optimal basis of the last cold solve is kept factorized. When the arguments are patched,
+    the basic solution of the new demand is one sparse triangular solve, and it is still optimal
+    if it stays nonnegative, no basic stage is excluded and the reduced costs stay nonnegative.
+    Otherwise the plan is solved cold again and its basis is kept instead.
+    The latency of every solve is recorded in `latencies` as `(warm, seconds)`.
+
+    Example:
+
+        session = PlannerSession(required={'D32钢': 1})
+        session.plan()
+        session.update(owned={'固源岩': 30})  # only 固源岩 changes, re-solved from the last basis
+    """
+
+    __tolerance = 1e-9
+
+    def __init__(self, planner: LocalPlanner = None, owned: dict[str:int] = {}, required: dict[str:int] = {},
+                 exp_demand: bool or int = True, gold_demand: bool or int = True, exclude: list[str] = [],
+                 input_lang: str = 'zh', output_lang: str = 'zh', server: str = 'CN') -> None:
+        """Create a session, see `get_plan` for the arguments.
+
+        Args:
+            `planner`: Optional; The local planner, `local_planner(server)` if `None`.
+        """
+        self.planner = planner or local_planner(server)
+        self.owned = dict(owned)
+        self.required = dict(required)
+        self.exclude = list(exclude)
+        self.exp_demand = exp_demand
+        self.gold_demand = gold_demand
+        self.input_lang = input_lang
+        self.output_lang = output_lang
+        self.latencies = []
+        self.__basis = None
+
+    def update(self, owned: dict[str:int] = None, required: dict[str:int] = None,
+               exclude: list[str] = None) -> dict[str:int or list[dict[str:str]]]:
+        """Patch the arguments and re-plan.
+
+        Args:
+            * `owned`: Optional; The changed counts of owned items, which are merged into the owned items.
+            * `required`: Optional; The changed counts of required items, which are merged into the required items.
+            * `exclude`: Optional; The new excluded stages, which replace the excluded stages.
+
+        Returns:
+            The plan, see `get_plan`.
+        """
+        self.owned.update(owned or {})
+        self.required.update(required or {})
+        if exclude is not None:
+            self.exclude = list(exclude)
+        return self.plan()
+
+    def plan(self) -> dict[str:int or list[dict[str:str]]]:
+        """Returns the plan of the current arguments, see `get_plan`."""
+        begin = time.perf_counter()
+        demand = self.planner.demand(self.owned, self.required, self.exp_demand, self.gold_demand, self.input_lang)
+        bounds = self.planner.bounds(self.exclude)
+        warm = self.__warm(demand, bounds)
+        if warm is None:
+            result = optimize.linprog(self.planner.cost, A_ub=-self.planner.matrix, b_ub=-demand, bounds=bounds,
+                                      method='highs')
+            if result.status != 0:
+                raise ValueError('no plan is found: ' + result.message)
+            solution, values = result.x, -result.ineqlin.marginals
+            self.__factorize(solution, result.ineqlin.residual, values)
+        else:
+            solution, values = warm
+        self.latencies.append((warm is not None, time.perf_counter() - begin))
+        return self.planner.format(solution, values, self.output_lang)
+
+    def __factorize(self, solution: numpy.ndarray, surplus: numpy.ndarray, values: numpy.ndarray) -> None:
+        """Keep the basis of an optimal solution factorized, or nothing if it cannot be recovered."""
+        self.__basis = None
+        rows = self.planner.matrix.shape[0]
+        structural = numpy.flatnonzero(solution > self.__tolerance)
+        slack = set(numpy.flatnonzero(surplus > self.__tolerance).tolist())
+        # A degenerate solution has fewer positive variables than rows, the basis is completed by the surplus of
+        # the rows whose value is zero first.
+        for row in numpy.argsort(numpy.abs(values), kind='stable'):
+            if len(structural) + len(slack) >= rows:
+                break
+            slack.add(int(row))
+        if len(structural) + len(slack) != rows:
+            return
+        slack = sorted(slack)
+        basis = sparse.hstack([self.planner.matrix[:, structural], -sparse.identity(rows, format='csc')[:, slack]])
+        try:
+            factor = linalg.splu(basis.tocsc())
+        except RuntimeError:
+            return
+        self.__basis = structural, slack, factor
+
+    def __warm(self, demand: numpy.ndarray, bounds: list[tuple]) -> tuple or None:
+        """Returns the solution and the values of items from the kept basis, or `None` if it is not optimal."""
+        if self.__basis is None:
+            return None
+        structural, slack, factor = self.__basis
+        if any(bounds[column][1] == 0 for column in structural):
+            return None
+        basic = factor.solve(demand)
+        if basic.min(initial=0) < -self.__tolerance:
+            return None
+        cost = numpy.concatenate([self.planner.cost[structural], numpy.zeros(len(slack))])
+        values = factor.solve(cost, trans='T')
+        reduced = self.planner.cost - self.planner.matrix.T @ values
+        allowed = numpy.array([upper != 0 for _, upper in bounds])
+        if reduced[allowed].min(initial=0) < -self.__tolerance or values.min(initial=0) < -self.__tolerance:
+            return None
+        solution = numpy.zeros(self.planner.matrix.shape[1])
+        solution[structural] = basic[:len(structural)]
+        return solution, values
+
+
 def __main() -> int:
     get_plan(required={'D32钢': 1})
     return 0
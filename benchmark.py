@@ -0,0 +1,497 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy
+from PIL import Image
+
+import adb
+import adbclient
+import arkplanner
+import fakeadb
+import farming
+import gametables
+import recognition
+import reporter
+import screens
+import tracing
+
+
+def __time_process(code: str, repeat: int) -> float:
+    """Returns the median wall time in seconds of running `code` in a fresh interpreter."""
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times)
+
+
+def cold_start(repeat: int = 5) -> None:
+    """Compare the cold start of the game tables from the JSON files and from the snapshot.
+
+    The tables must have been downloaded by `gametables.load_tables` before.
+
+    Args:
+        `repeat`: Optional; How many processes are started for each loader.
+    """
+    with open('data/data_version.txt', 'rb') as f:
+        data_version = f.read().decode()
+    gametables.save_snapshot(gametables.SNAPSHOT, gametables.parse_tables(), data_version)
+
+    baseline = __time_process('import gametables', repeat)
+    parse = __time_process('import gametables; gametables.parse_tables()', repeat)
+    snapshot = __time_process('import gametables; gametables.load_snapshot(gametables.SNAPSHOT, %r)'
+                              % data_version, repeat)
+    print('解释器启动与导入:', round(baseline * 1000, 1), 'ms')
+    print('解析JSON:', round((parse - baseline) * 1000, 1), 'ms')
+    print('读取快照:', round((snapshot - baseline) * 1000, 1), 'ms')
+
+
+def __measure(function) -> float and int:
+    """Returns the wall time in seconds and the peak of traced memory in bytes of calling `function`."""
+    tracemalloc.start()
+    begin = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - begin
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def json_extraction() -> None:
+    """Compare decoding the used subtrees of the table files by `json.load` and by `gametables.extract_json`.
+
+    The tables must have been downloaded by `gametables.load_tables` before.
+    """
+    for name, key in [('item_table.json', 'items'), ('stage_table.json', 'stages'),
+                      ('building_data.json', 'workshopFormulas')]:
+        path = 'data/' + name
+
+        def load():
+            with open(path, 'rb') as f:
+                return json.load(f)[key]
+
+        for label, function in [('json.load', load), ('extract_json', lambda: gametables.extract_json(path, [key]))]:
+            elapsed, peak = __measure(function)
+            print(name, label, '耗时:', round(elapsed * 1000, 1), 'ms', '内存峰值:', round(peak / 2 ** 20, 1), 'MiB')
+
+
+def replanning(rounds: int = 50) -> None:
+    """Compare re-planning by cold solves and by a `arkplanner.PlannerSession` while a few owned counts change.
+
+    The tables and the drop matrix must have been downloaded by `gametables.load_tables` and
+    `arkplanner.update_matrix` before.
+
+    Args:
+        `rounds`: Optional; How many times the owned counts are patched.
+    """
+    planner = arkplanner.local_planner()
+    required = {item: 10 for item in random.sample(planner.formulas, 20)}
+    session = arkplanner.PlannerSession(planner, required=required, input_lang='id')
+    session.plan()
+    cold = []
+    for _ in range(rounds):
+        patch = {item: random.randint(0, 30) for item in random.sample(planner.items[:-2], 3)}
+        session.update(owned=patch)
+        begin = time.perf_counter()
+        planner.plan(session.owned, session.required, input_lang='id')
+        cold.append(time.perf_counter() - begin)
+    warm = [latency for hit, latency in session.latencies[1:] if hit]
+    print('冷启动求解:', round(statistics.mean(cold) * 1000, 2), 'ms')
+    print('增量求解命中:', len(warm), '/', rounds)
+    if warm:
+        print('增量求解:', round(statistics.mean(warm) * 1000, 2), 'ms')
+
+
+@contextmanager
+def __serve(respond, delay: float = 0.0):
+    """Serve a local HTTP stand-in with keep-alive connections.
+
+    Args:
+        * `respond`: A callable taking the handler and the JSON body of a POST request, and returning
+        the status code and the JSON response.
+        * `delay`: Optional; The time the stand-in takes to handle a request in seconds.
+
+    Yields:
+        The URL of the stand-in.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(delay)
+            status, response = respond(self, body)
+            content = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:' + str(server.server_port) + '/'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def batch_planning(count: int = 200, workers: int = 16, delay: float = 0.02) -> None:
+    """Compare planning one by one by `arkplanner.get_plan` and in a batch by `arkplanner.get_plans`.
+
+    Args:
+        * `count`: Optional; How many plans are requested.
+        * `workers`: Optional; The maximum number of concurrent requests of the batch.
+        * `delay`: Optional; The time the local stand-in of the planner takes to solve a plan in seconds.
+    """
+    plan = {'cost': 0, 'gcost': 0, 'gold': 0, 'exp': 0, 'stages': [], 'syntheses': [], 'values': []}
+    batch = [{'required': {'D32钢': i}} for i in range(count)]
+    with __serve(lambda handler, body: (200, plan), delay) as url:
+        begin = time.perf_counter()
+        for arguments in batch:
+            arkplanner.get_plan(**arguments, url=url)
+        sequential = time.perf_counter() - begin
+        begin = time.perf_counter()
+        results = arkplanner.get_plans(batch, workers, url=url)
+        concurrent = time.perf_counter() - begin
+    errors = sum(isinstance(result, Exception) for result in results)
+    print('逐个规划:', round(count / sequential, 1), '次/秒')
+    print('批量规划:', round(count / concurrent, 1), '次/秒', '失败:', errors)
+
+
+def reporting(count: int = 500, failure_rate: float = 0.2, delay: float = 0.005) -> None:
+    """Measure the throughput and the delivery of `reporter.ReportSpool` against a fake Penguin Stats.
+
+    The fake server fails a part of the reports at random, and the spool is closed and reopened
+    halfway, to check that every report is accepted exactly once.
+
+    Args:
+        * `count`: Optional; How many reports are spooled.
+        * `failure_rate`: Optional; The probability that the fake server fails a report.
+        * `delay`: Optional; The time the fake server takes to handle a report in seconds.
+    """
+    accepted = []
+
+    def respond(handler, body):
+        if random.random() < failure_rate:
+            return 503, {'message': 'unavailable'}
+        accepted.append(body['stageId'])
+        return 201, {}
+
+    with __serve(respond, delay) as url, tempfile.TemporaryDirectory() as directory:
+        path = directory + '/reports.spool'
+        drops = [{'dropType': 'NORMAL_DROP', 'itemId': '30013', 'quantity': 1}]
+        begin = time.perf_counter()
+        spool = reporter.ReportSpool(path, reporter.PenguinClient(url), backoff=0.01, max_backoff=0.1)
+        for i in range(count // 2):
+            spool.put('main_' + str(i), drops)
+        spool.close(timeout=0)
+        retries = spool.retries
+        spool = reporter.ReportSpool(path, reporter.PenguinClient(url), backoff=0.01, max_backoff=0.1)
+        for i in range(count // 2, count):
+            spool.put('main_' + str(i), drops)
+        spool.put('main_0', drops, key='battle')
+        spool.put('main_0', drops, key='battle')
+        spool.flush()
+        elapsed = time.perf_counter() - begin
+        spool.close()
+        retries += spool.retries
+    print('上报:', round((count + 1) / elapsed, 1), '次/秒', '重试:', retries)
+    print('送达:', len(accepted), '不同:', len(set(accepted)), '应为:', count, '+ 1')
+
+
+def drop_recognition(directory: str = 'data/screenshots/') -> None:
+    """Measure the throughput of `recognition.DropRecognizer` over the result screens saved in a directory.
+
+    Args:
+        `directory`: Optional; The directory of the screenshots in PNG.
+    """
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.png'):
+            with Image.open(os.path.join(directory, name)) as image:
+                frames.append(numpy.asarray(image.convert('RGB')))
+    height, width = frames[0].shape[:2]
+    begin = time.perf_counter()
+    index = recognition.template_index(width, height)
+    print('模板索引:', len(index.ids), '个物品', index.sizes, '像素', round((time.perf_counter() - begin) * 1000, 1), 'ms')
+    begin = time.perf_counter()
+    recognition.TemplateIndex(index.path)
+    print('加载模板索引:', round((time.perf_counter() - begin) * 1000, 2), 'ms')
+    recognizer = recognition.DropRecognizer(index)
+    begin = time.perf_counter()
+    items = sum(len(recognizer.recognize(frame)) for frame in frames)
+    elapsed = time.perf_counter() - begin
+    print('截图:', len(frames), '物品:', items)
+    print('识别:', round(items / elapsed, 1), '个/秒', round(len(frames) / elapsed, 1), '帧/秒')
+
+
+def screen_classification(directory: str = 'data/screens/', repeat: int = 100) -> None:
+    """Measure the latency and the accuracy of `screens.ScreenIndex` over labeled screenshots.
+
+    Args:
+        * `directory`: Optional; A directory of labeled screenshots as `screens.train` takes.
+        * `repeat`: Optional; How many times every screenshot is classified.
+    """
+    with tempfile.TemporaryDirectory() as temporary:
+        index = screens.train(directory, temporary + '/screens.json')
+    frames = []
+    for label in sorted(os.listdir(directory)):
+        for name in sorted(os.listdir(os.path.join(directory, label))):
+            if name.endswith('.png'):
+                with Image.open(os.path.join(directory, label, name)) as image:
+                    frames.append((label, numpy.asarray(image.convert('RGB'))))
+    correct = sum(index.classify(frame) == label for label, frame in frames)
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        for label, frame in frames:
+            index.classify(frame)
+    elapsed = time.perf_counter() - begin
+    print('截图:', len(frames), '哈希:', len(index.entries), '正确:', correct)
+    print('分类:', round(elapsed / repeat / len(frames) * 1000, 3), 'ms/帧')
+
+
+def frame_gating(directory: str = 'data/screenshots/', repeat: int = 20) -> None:
+    """Compare the cost of recognizing every polled frame and of gating them by `screens.FrameGate`.
+
+    Every screenshot in the directory is polled `repeat` times in a row, like a screen that stays
+    still while a battle goes on.
+
+    Args:
+        * `directory`: Optional; The directory of the screenshots in PNG.
+        * `repeat`: Optional; How many times every screenshot is polled.
+    """
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.png'):
+            with Image.open(os.path.join(directory, name)) as image:
+                frames.append(numpy.asarray(image.convert('RGB')))
+    recognizer = recognition.DropRecognizer()
+    recognizer.recognize(frames[0])
+    polled = [frame for frame in frames for _ in range(repeat)]
+    begin = time.perf_counter()
+    for frame in polled:
+        recognizer.recognize(frame)
+    ungated = time.perf_counter() - begin
+    gate = screens.FrameGate()
+    begin = time.perf_counter()
+    for frame in gate.filter(polled):
+        recognizer.recognize(frame)
+    gated = time.perf_counter() - begin
+    print('帧:', gate.frames, '跳过:', gate.skipped, '跳过率:', round(gate.skip_rate() * 100, 1), '%')
+    print('逐帧识别:', round(ungated / len(polled) * 1000, 3), 'ms/帧')
+    print('变化检测后识别:', round(gated / len(polled) * 1000, 3), 'ms/帧')
+
+
+def pipelining(frames: int = 100, capture: float = 0.03, recognize: float = 0.02, dispatch: float = 0.01) -> None:
+    """Compare a serial farming loop with `farming.Farm` on a stand-in device.
+
+    The stand-in device takes `capture` seconds to capture a changed frame and `dispatch` seconds
+    to tap, and the recognition is replaced by a wait of `recognize` seconds.
+
+    Args:
+        * `frames`: Optional; How many frames are handled.
+        * `capture`: Optional; The time a capture takes in seconds.
+        * `recognize`: Optional; The time a recognition takes in seconds.
+        * `dispatch`: Optional; The time a tap takes in seconds.
+    """
+    class Device:
+        def __init__(self):
+            self.frame = numpy.zeros((720, 1280, 4), numpy.uint8)
+            self.captures = 0
+
+        def screencap(self):
+            time.sleep(capture)
+            self.captures += 1
+            self.frame[:] = self.captures * 16 % 256
+            return self.frame
+
+        def tap(self, x, y):
+            time.sleep(dispatch)
+
+    def decide(observation):
+        time.sleep(recognize)
+        return [('tap', 0, 0)]
+
+    device = Device()
+    begin = time.perf_counter()
+    for _ in range(frames):
+        decide({'frame': numpy.array(device.screencap())})
+        device.tap(0, 0)
+    serial = time.perf_counter() - begin
+    farm = farming.Farm(Device(), decide, index=screens.ScreenIndex())
+    begin = time.perf_counter()
+    asyncio.run(farm.run(serial / 2))
+    pipelined = time.perf_counter() - begin
+    stats = farm.stats()
+    print('串行:', round(frames / serial, 1), '帧/秒', '反应:', round(serial / frames * 1000, 1), 'ms')
+    print('流水线:', round(stats['dispatch']['count'] / pipelined, 1), '帧/秒',
+          '反应:', round(stats['reaction']['mean'], 1), 'ms', 'P95:', round(stats['reaction']['p95'], 1), 'ms')
+    for stage in farming.STAGES[:-1]:
+        print(stage, round(stats[stage]['mean'], 1), 'ms')
+
+
+def adb_paths(taps: int = 500, captures: int = 50, latency: float = 0.0, frames: str = None) -> None:
+    """Load-test the input and the capture paths of `adb.Device` against `fakeadb.FakeServer`.
+
+    Args:
+        * `taps`: Optional; How many taps are sent.
+        * `captures`: Optional; How many frames are captured.
+        * `latency`: Optional; The time the stand-in device takes for every command in seconds.
+        * `frames`: Optional; A directory of PNG images the stand-in device serves, a black screen if `None`.
+    """
+    stand_in = fakeadb.FakeDevice('fakeadb-5554', frames=frames, latency=latency)
+    with fakeadb.FakeServer([stand_in]) as server, tempfile.TemporaryDirectory() as directory:
+        adbclient.PORT, port = server.port, adbclient.PORT
+        try:
+            device = adb.Device(stand_in.serial, adb.Profiles(directory + '/devices.json'))
+            print('设备:', adb.devices(), '分辨率:', device.wm_size(), 'ppi:', device.wm_density())
+            begin = time.perf_counter()
+            for i in range(taps):
+                device.tap(i % 1280, i % 720)
+            elapsed = time.perf_counter() - begin
+            print('input tap:', round(taps / elapsed, 1), '次/秒', '平均:', round(device.shell.mean_latency() * 1000, 3), 'ms')
+            begin = time.perf_counter()
+            for i in range(taps):
+                device.touch().tap(i % 1280, i % 720, 0)
+            elapsed = time.perf_counter() - begin
+            print('注入触摸:', round(taps / elapsed, 1), '次/秒')
+            begin = time.perf_counter()
+            for _ in range(captures):
+                frame = device.screencap()
+            elapsed = time.perf_counter() - begin
+            print('截图:', frame.shape, round(captures / elapsed, 1), '帧/秒',
+                  round(captures * frame.nbytes / elapsed / 2 ** 20, 1), 'MiB/s')
+            print('收到输入:', len(stand_in.inputs), '应为:', taps * 2)
+            device.shell.close()
+        finally:
+            adbclient.PORT = port
+
+
+def sync_transfer(files: int = 200, size: int = 64 * 1024, changes: int = 10, latency: float = 0.001) -> None:
+    """Compare copying a directory tree file by file and by `adb.Device.push_changed` and `pull_changed`.
+
+    Args:
+        * `files`: Optional; How many files are in the tree.
+        * `size`: Optional; The size of every file in bytes.
+        * `changes`: Optional; How many files are changed between the transfers.
+        * `latency`: Optional; The time the stand-in device takes for every request in seconds.
+    """
+    stand_in = fakeadb.FakeDevice('fakeadb-5554', latency=latency)
+    with fakeadb.FakeServer([stand_in]) as server, tempfile.TemporaryDirectory() as directory:
+        adbclient.PORT, port = server.port, adbclient.PORT
+        try:
+            device = adb.Device(stand_in.serial, adb.Profiles(directory + '/devices.json'))
+            paths = []
+            for i in range(files):
+                path = os.path.join(directory, 'tree', str(i % 10), str(i) + '.bin')
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(random.randbytes(size))
+                paths.append(path)
+            begin = time.perf_counter()
+            total = sum(device.push(path, '/sdcard/flat/' + os.path.basename(path)) for path in paths)
+            elapsed = time.perf_counter() - begin
+            print('逐个推送:', round(total / elapsed / 2 ** 20, 1), 'MiB/s', round(elapsed * 1000, 1), 'ms')
+
+            def show(label, report):
+                print(label, '文件:', report['files'], '复制:', report['copied'], '跳过:', report['skipped'],
+                      round(report['rate'] / 2 ** 20, 1), 'MiB/s', round(report['seconds'] * 1000, 1), 'ms')
+
+            show('推送:', device.push_changed(directory + '/tree', '/sdcard/tree'))
+            show('无变化推送:', device.push_changed(directory + '/tree', '/sdcard/tree'))
+            for path in random.sample(paths, changes):
+                with open(path, 'r+b') as f:
+                    f.write(random.randbytes(16))
+            show('部分变化推送:', device.push_changed(directory + '/tree', '/sdcard/tree'))
+            show('拉取:', device.pull_changed('/sdcard/tree', directory + '/copy'))
+            show('无变化拉取:', device.pull_changed('/sdcard/tree', directory + '/copy', 'mtime'))
+            device.shell.close()
+        finally:
+            adbclient.PORT = port
+
+
+def tracing_overhead(taps: int = 2000, calls: int = 1000000) -> None:
+    """Measure the overhead of `tracing.traced` and trace taps on `fakeadb.FakeServer`.
+
+    Args:
+        * `taps`: Optional; How many taps are traced.
+        * `calls`: Optional; How many calls of an empty function are timed.
+    """
+    def plain():
+        pass
+
+    wrapped = tracing.traced('plain')(plain)
+    for label, function in [('未装饰', plain), ('装饰, 关闭追踪', wrapped)]:
+        begin = time.perf_counter()
+        for _ in range(calls):
+            function()
+        print(label, round((time.perf_counter() - begin) / calls * 1e9, 1), 'ns/次')
+    stand_in = fakeadb.FakeDevice('fakeadb-5554')
+    with fakeadb.FakeServer([stand_in]) as server, tempfile.TemporaryDirectory() as directory:
+        adbclient.PORT, port = server.port, adbclient.PORT
+        try:
+            device = adb.Device(stand_in.serial, adb.Profiles(directory + '/devices.json'))
+            device.tap(0, 0)
+            for label in ['关闭追踪', '开启追踪']:
+                tracer = tracing.enable(directory + '/adb.trace.json') if label == '开启追踪' else None
+                begin = time.perf_counter()
+                for i in range(taps):
+                    device.tap(i % 1280, i % 720)
+                print(label, 'tap:', round((time.perf_counter() - begin) / taps * 1e6, 1), 'us/次')
+            tracing.disable()
+            device.screencap()
+            device.shell.close()
+            with open(tracer.path, encoding='utf-8') as f:
+                print('追踪事件:', len(json.load(f)['traceEvents']))
+            for (name, serial), stats in sorted(tracer.summary().items()):
+                print(name, serial, stats['count'], '次', '平均:', round(stats['mean'], 3), 'ms',
+                      'P50≤', stats['p50'], 'ms', 'P99≤', stats['p99'], 'ms')
+        finally:
+            adbclient.PORT = port
+
+
+__benchmarks = {
+    'cold_start': cold_start,
+    'json_extraction': json_extraction,
+    'replanning': replanning,
+    'batch_planning': batch_planning,
+    'reporting': reporting,
+    'drop_recognition': drop_recognition,
+    'screen_classification': screen_classification,
+    'frame_gating': frame_gating,
+    'pipelining': pipelining,
+    'adb_paths': adb_paths,
+    'sync_transfer': sync_transfer,
+    'tracing_overhead': tracing_overhead,
+}
+
+
+def __main() -> int:
+    names = sys.argv[1:] or list(__benchmarks)
+    for name in names:
+        print('==', name, '==')
+        __benchmarks[name]()
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
@@ -0,0 +1,135 @@
+from collections.abc import Mapping
+import threading
+
+import numpy
+
+import gametables
+
+__closures = {}  # 合成闭包缓存, key为数据版本, value为对应的CraftingClosure
+__lock = threading.Lock()
+
+
+class CraftingClosure:
+    """The full base-material expansion of every item in a formula table.
+
+    The recipes form a DAG, which is ordered topologically once so that every item comes after
+    its materials. The expansion of an item into base materials, the items without a recipe,
+    is then a row of `matrix` over the item indices, and the requirement of many targets is
+    rolled up by a single matrix product.
+
+    Example:
+
+        closure = CraftingClosure()
+        closure.expand({'30014': 2})  # the base materials of 2 items 30014
+        closure.expand_many([{'30014': 2}, {'30024': 1}])  # a (2, len(closure.items)) array
+    """
+
+    def __init__(self, formula_table: Mapping = gametables.formula_table) -> None:
+        """Build the closure.
+
+        Args:
+            `formula_table`: Optional; A dict whose `key` is the `id` of an item and the `value` is
+            another `dict` whose `key` is the `id` of a material and the `value` is the `number`
+            of the material, the same as `gametables.formula_table`.
+
+        Raises:
+            ValueError: The recipes contain a cycle.
+        """
+        self.formulas = {item: dict(costs) for item, costs in formula_table.items()}
+        self.order = self.__sort()
+        self.items = sorted(self.order)
+        self.index = {item: i for i, item in enumerate(self.items)}
+        self.base = numpy.array([item not in self.formulas for item in self.items])
+        self.matrix = numpy.zeros((len(self.items), len(self.items)))
+        for item in self.order:
+            row = self.matrix[self.index[item]]
+            if item in self.formulas:
+                for material, count in self.formulas[item].items():
+                    row += count * self.matrix[self.index[material]]
+            else:
+                row[self.index[item]] = 1
+
+    def __sort(self) -> list[str]:
+        """Returns the items in topological order, materials before the items made from them."""
+        order, state = [], {}
+        for root in self.formulas:
+            stack = [(root, False)]
+            while stack:
+                item, done = stack.pop()
+                if done:
+                    state[item] = 2
+                    order.append(item)
+                    continue
+                if state.get(item) == 2:
+                    continue
+                if state.get(item) == 1:
+                    raise ValueError('cycle in recipes at item ' + item)
+                state[item] = 1
+                stack.append((item, True))
+                for material in self.formulas.get(item, {}):
+                    if state.get(material) != 2:
+                        stack.append((material, False))
+        return order
+
+    def vector(self, counts: Mapping) -> numpy.ndarray:
+        """Returns the counts of items as a vector over the item indices.
+
+        Args:
+            `counts`: A dict whose `key` is the `id` of an item and the `value` is the count.
+
+        Raises:
+            KeyError: An item is not in any recipe.
+        """
+        vector = numpy.zeros(len(self.items))
+        for item, count in counts.items():
+            vector[self.index[item]] += count
+        return vector
+
+    def expand_many(self, demands: list[Mapping] or numpy.ndarray) -> numpy.ndarray:
+        """Roll up the base materials required by many demands in a single call.
+
+        Args:
+            `demands`: A list of dicts like `vector` takes, or an array of shape
+            `(len(demands), len(items))` whose rows are such vectors.
+
+        Returns:
+            An array of shape `(len(demands), len(items))`, whose rows are the counts of
+            base materials required by the demands.
+        """
+        if not isinstance(demands, numpy.ndarray):
+            demands = numpy.stack([self.vector(demand) for demand in demands]) if demands \
+                else numpy.zeros((0, len(self.items)))
+        return demands @ self.matrix
+
+    def expand(self, demand: Mapping) -> dict[str:float]:
+        """Returns the base materials required by a demand.
+
+        Args:
+            `demand`: A dict whose `key` is the `id` of an item and the `value` is the count.
+
+        Returns:
+            A dict whose `key` is the `id` of a base material and the `value` is the count.
+        """
+        row = self.vector(demand) @ self.matrix
+        return {self.items[i]: float(row[i]) for i in numpy.flatnonzero(row)}
+
+
+def closure() -> CraftingClosure:
+    """Returns the crafting closure of the local tables, which is built once per data version."""
+    version = gametables.data_version()
+    with __lock:
+        if version not in __closures:
+            __closures.clear()
+            __closures[version] = CraftingClosure()
+        return __closures[version]
+
+
+def __main() -> int:
+    result = closure().expand({item: 1 for item in gametables.formula_table})
+    for item, count in result.items():
+        print(gametables.find_item_name[item], ':', count)
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
@@ -0,0 +1,344 @@
+import hashlib
+import os
+import re
+import shlex
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+import numpy
+from PIL import Image
+
+
+class FakeDevice:
+    """A stand-in of a device answering the commands `adb.py` sends.
+
+    It answers `wm size`, `wm density`, `getprop`, `getevent -p`, `md5sum`, `echo`, `printf`, records
+    `input tap`, `input swipe`, `input keyevent` and injected touch events in `inputs`, and
+    serves `screencap` from a recorded image sequence. Files pushed and pulled by the sync
+    protocol are kept in memory in `files`. A command starting with a key of `failures` prints
+    the value and exits with status 1, which `$?` expands to. Every command takes `latency` seconds.
+
+    Example:
+
+        device = FakeDevice('emulator-5554', frames='data/recording/', latency=0.01)
+        with FakeServer([device]) as server:
+            client = adbclient.Client('emulator-5554', port=server.port)
+            client.shell('input tap 100 200')
+            device.inputs  # [('tap', 100, 200)]
+    """
+
+    def __init__(self, serial: str = 'emulator-5554', size: tuple[int, int] = (1280, 720), density: int = 320,
+                 frames: str or list = None, latency: float = 0.0, touch_max: tuple[int, int] = (32767, 32767),
+                 abi: str = 'x86_64', fingerprint: str = 'Ash/fake/fake:9/PQ3A/1:user/release-keys') -> None:
+        """Create a device.
+
+        Args:
+            * `serial`: Optional; The serial number.
+            * `size`: Optional; The horizontal and vertical resolution of the screen.
+            * `density`: Optional; The screen density.
+            * `frames`: Optional; A directory of PNG images or a list of arrays of shape
+            `(height, width, 3 or 4)` served by `screencap` in turn, a black screen if `None`.
+            * `latency`: Optional; The time every command takes in seconds.
+            * `touch_max`: Optional; The maximum of the horizontal and vertical touchscreen coordinates.
+            * `abi`: Optional; The primary ABI.
+            * `fingerprint`: Optional; The build fingerprint.
+        """
+        self.serial = serial
+        self.size = size
+        self.density = density
+        self.latency = latency
+        self.touch_max = touch_max
+        self.abi = abi
+        self.fingerprint = fingerprint
+        self.touch_node = '/dev/input/event2'
+        self.inputs = []
+        self.commands = []
+        self.files = {}  # 路径 -> [内容, 权限, 修改时间]
+        self.failures = {}  # 命令前缀 -> 失败时的错误信息
+        self.lock = threading.Lock()
+        self.frames = [self.__encode(frame) for frame in self.__load(frames)]
+        self.__frame = 0
+        self.__status = 0
+
+    def __load(self, frames: str or list or None) -> list[numpy.ndarray]:
+        if frames is None:
+            return [numpy.zeros((self.size[1], self.size[0], 4), numpy.uint8)]
+        if isinstance(frames, str):
+            images = []
+            for name in sorted(os.listdir(frames)):
+                if name.endswith('.png'):
+                    with Image.open(os.path.join(frames, name)) as image:
+                        images.append(numpy.asarray(image.convert('RGBA')))
+            return images
+        return list(frames)
+
+    def __encode(self, frame: numpy.ndarray) -> bytes:
+        """Returns a frame in the raw format of `screencap` since Android 9, with a 16 byte header."""
+        if frame.shape[2] == 3:
+            frame = numpy.dstack([frame, numpy.full(frame.shape[:2], 255, numpy.uint8)])
+        height, width = frame.shape[:2]
+        return struct.pack('<IIII', width, height, 1, 0) + numpy.ascontiguousarray(frame, numpy.uint8).tobytes()
+
+    def screencap(self) -> bytes:
+        """Returns the next frame in the raw format of `screencap`."""
+        time.sleep(self.latency)
+        with self.lock:
+            frame = self.frames[self.__frame % len(self.frames)]
+            self.__frame += 1
+        return frame
+
+    def run(self, command: str) -> str:
+        """Run a shell command line and returns its output."""
+        time.sleep(self.latency)
+        with self.lock:
+            self.commands.append(command)
+            return ''.join(self.__run(part.replace('$?', str(self.__status))) for part in split(command))
+
+    def __run(self, command: str) -> str:
+        self.__status = 0
+        for prefix, message in self.failures.items():
+            if command.startswith(prefix):
+                self.__status = 1
+                return message + '\n'
+        if command.startswith('{'):
+            self.inputs.append(('events', command))
+            return ''
+        words = shlex.split(command)
+        if not words:
+            return ''
+        if words[0] == 'echo':
+            return ' '.join(words[1:]) + '\n'
+        if words[0] == 'printf':
+            return words[1].replace('\\n', '\n').replace('%d', '%s') % tuple(words[2:])
+        if words[:2] == ['wm', 'size']:
+            return 'Physical size: %dx%d\n' % self.size
+        if words[:2] == ['wm', 'density']:
+            return 'Physical density: %d\n' % self.density
+        if words[:2] == ['getprop', 'ro.build.fingerprint']:
+            return self.fingerprint + '\n'
+        if words[:2] == ['getprop', 'ro.product.cpu.abi']:
+            return self.abi + '\n'
+        if words[:2] == ['getevent', '-p']:
+            return self.__getevent()
+        if words[0] == 'input' and words[1:2] == ['tap']:
+            self.inputs.append(('tap', int(words[2]), int(words[3])))
+            return ''
+        if words[0] == 'input' and words[1:2] == ['swipe']:
+            self.inputs.append(('swipe',) + tuple(int(word) for word in words[2:6]))
+            return ''
+        if words[0] == 'input' and words[1:2] == ['keyevent']:
+            self.inputs.append(('keyevent', int(words[2])))
+            return ''
+        if words[0] == 'md5sum':
+            return ''.join(self.__md5(path) for path in words[1:])
+        return ''
+
+    def __md5(self, path: str) -> str:
+        if path not in self.files:
+            return ''
+        return hashlib.md5(self.files[path][0]).hexdigest() + '  ' + path + '\n'
+
+    def __getevent(self) -> str:
+        return ('add device 1: /dev/input/event1\n'
+                '  name:     "Power Button"\n'
+                '  events:\n'
+                '    KEY (0001): 0074\n'
+                'add device 2: ' + self.touch_node + '\n'
+                '  name:     "virtio_input_multi_touch"\n'
+                '  events:\n'
+                '    ABS (0003): 002f  : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0\n'
+                '                0035  : value 0, min 0, max %d, fuzz 0, flat 0, resolution 0\n'
+                '                0036  : value 0, min 0, max %d, fuzz 0, flat 0, resolution 0\n'
+                '                0039  : value 0, min 0, max 65535, fuzz 0, flat 0, resolution 0\n'
+                % self.touch_max)
+
+
+def split(command: str) -> list[str]:
+    """Split a shell command line at the `;` outside quotes and braces."""
+    parts, current, quote, depth = [], [], None, 0
+    for character in command:
+        if quote:
+            quote = None if character == quote else quote
+        elif character in '\'"':
+            quote = character
+        elif character == '{':
+            depth += 1
+        elif character == '}':
+            depth -= 1
+        elif character == ';' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(character)
+    parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+
+class FakeServer(socketserver.ThreadingTCPServer):
+    """A stand-in of the adb server on a local port, serving `FakeDevice`s.
+
+    It speaks the host services `host:version`, `host:devices` and `host:transport`, and the
+    device services `shell:`, `exec:` (with an interactive `sh` and `screencap`) and `sync:`.
+
+    Example:
+
+        with FakeServer([FakeDevice()]) as server:
+            adbclient.PORT = server.port  # the clients created from now on talk to the stand-in
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, devices: list[FakeDevice], host: str = '127.0.0.1', port: int = 0) -> None:
+        """Start serving in a background thread.
+
+        Args:
+            * `devices`: The devices attached.
+            * `host`: Optional; The host to listen on.
+            * `port`: Optional; The port to listen on, a free port if 0.
+        """
+        super().__init__((host, port), Handler)
+        self.devices = {device.serial: device for device in devices}
+        self.port = self.server_address[1]
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Handle a connection to `FakeServer`."""
+
+    disable_nagle_algorithm = True
+
+    def handle(self) -> None:
+        device = None
+        while True:
+            length = self.rfile.read(4)
+            if len(length) < 4:
+                return
+            request = self.rfile.read(int(length, 16)).decode()
+            if request == 'host:version':
+                self.__okay('%04x' % 41)
+                return
+            if request in ('host:devices', 'host:devices-l'):
+                self.__okay(''.join(serial + '\tdevice\n' for serial in self.server.devices))
+                return
+            if request.startswith('host:transport'):
+                serial = request[len('host:transport:'):] if request.startswith('host:transport:') else None
+                devices = self.server.devices
+                if serial is None and len(devices) != 1:
+                    return self.__fail('more than one device/emulator' if devices else 'no devices/emulators found')
+                device = devices.get(serial) if serial is not None else next(iter(devices.values()))
+                if device is None:
+                    return self.__fail("device '" + serial + "' not found")
+                self.wfile.write(b'OKAY')
+                continue
+            if device is None:
+                return self.__fail('unknown host service ' + request)
+            self.wfile.write(b'OKAY')
+            if request.startswith('shell:'):
+                self.wfile.write(device.run(request[len('shell:'):]).encode())
+            elif request == 'exec:screencap':
+                self.wfile.write(device.screencap())
+            elif re.match(r'exec:sh\b', request):
+                self.__interactive(device)
+            elif request.startswith('exec:'):
+                self.wfile.write(device.run(request[len('exec:'):]).encode())
+            elif request == 'sync:':
+                self.__sync(device)
+            return
+
+    def __okay(self, data: str) -> None:
+        data = data.encode()
+        self.wfile.write(b'OKAY' + b'%04x' % len(data) + data)
+
+    def __fail(self, message: str) -> None:
+        data = message.encode()
+        self.wfile.write(b'FAIL' + b'%04x' % len(data) + data)
+
+    def __interactive(self, device: FakeDevice) -> None:
+        for line in self.rfile:
+            command = line.decode().strip()
+            if command == 'exit':
+                return
+            self.wfile.write(device.run(command).encode())
+            self.wfile.flush()
+
+    def __sync(self, device: FakeDevice) -> None:
+        while True:
+            header = self.rfile.read(8)
+            if len(header) < 8:
+                return
+            id, length = struct.unpack('<4sI', header)
+            if id == b'QUIT':
+                return
+            path = self.rfile.read(length).decode(errors='surrogateescape')
+            time.sleep(device.latency)
+            if id == b'STAT':
+                data, mode, mtime = device.files.get(path, (b'', 0, 0))
+                if path not in device.files and any(name.startswith(path.rstrip('/') + '/') for name in device.files):
+                    mode = stat.S_IFDIR | 0o755
+                self.wfile.write(struct.pack('<4sIII', b'STAT', mode, len(data), mtime))
+            elif id == b'LIST':
+                self.__list(device, path)
+            elif id == b'RECV':
+                if path not in device.files:
+                    message = b'No such file or directory'
+                    self.wfile.write(struct.pack('<4sI', b'FAIL', len(message)) + message)
+                    continue
+                data = device.files[path][0]
+                for begin in range(0, len(data), 64 * 1024):
+                    chunk = data[begin:begin + 64 * 1024]
+                    self.wfile.write(struct.pack('<4sI', b'DATA', len(chunk)) + chunk)
+                self.wfile.write(struct.pack('<4sI', b'DONE', 0))
+            elif id == b'SEND':
+                name, mode = path.rsplit(',', 1)
+                chunks = []
+                while True:
+                    id, length = struct.unpack('<4sI', self.rfile.read(8))
+                    if id == b'DONE':
+                        break
+                    chunks.append(self.rfile.read(length))
+                with device.lock:
+                    device.files[name] = [b''.join(chunks), int(mode), length]
+                self.wfile.write(struct.pack('<4sI', b'OKAY', 0))
+            else:
+                return
+
+    def __list(self, device: FakeDevice, path: str) -> None:
+        prefix = path.rstrip('/') + '/'
+        entries = {}
+        for name, (data, mode, mtime) in list(device.files.items()):
+            if name.startswith(prefix):
+                rest = name[len(prefix):]
+                if '/' in rest:
+                    entries.setdefault(rest.split('/')[0], (stat.S_IFDIR | 0o755, 0, mtime))
+                else:
+                    entries[rest] = (mode, len(data), mtime)
+        for name, (mode, size, mtime) in entries.items():
+            encoded = name.encode(errors='surrogateescape')
+            self.wfile.write(struct.pack('<4sIIII', b'DENT', mode, size, mtime, len(encoded)) + encoded)
+        self.wfile.write(struct.pack('<4sIIII', b'DONE', 0, 0, 0, 0))
+
+
+def __main() -> int:
+    import sys
+
+    frames = sys.argv[1] if sys.argv[1:] else None
+    server = FakeServer([FakeDevice(frames=frames, latency=0.005)], port=5037)
+    print('模拟adb server已启动, 端口:', server.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
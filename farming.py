@@ -0,0 +1,212 @@
+import asyncio
+import collections
+import statistics
+import time
+import uuid
+
+import numpy
+
+import adb
+import recognition
+import reporter
+import screens
+
+# 各界面状态下点击的位置, 为占屏幕的比例, None表示停止
+TAPS = {
+    'stage_select': (0.88, 0.92),  # 开始行动
+    'squad': (0.85, 0.75),  # 编队界面的开始行动
+    'result': (0.5, 0.5),  # 结算界面, 点击继续
+    'sanity_refill': None,  # 理智不足, 停止
+}
+STAGES = ('capture', 'recognize', 'decide', 'dispatch', 'reaction')
+
+
+class Farm:
+    """A pipelined farming loop on a device.
+
+    Capturing, recognizing, deciding and dispatching run as separate asyncio stages joined by
+    bounded queues. The blocking calls to the device and the recognition run in threads, so
+    that the frame N + 1 is captured while the frame N is recognized and an action is
+    dispatched. A full queue drops its oldest item, so that the later stages always see the
+    freshest screen.
+
+    Frames that have not changed are dropped by a `screens.FrameGate`. The time spent in every
+    stage and the reaction time from the capture of a frame to the end of its actions are
+    recorded in `latencies`.
+
+    Example:
+
+        farm = Farm(stage_id='main_01-07')
+        asyncio.run(farm.run(3600))
+        print(farm.stats())
+    """
+
+    def __init__(self, device: adb.Device = None, decide=None, stage_id: str = None,
+                 index: screens.ScreenIndex = None, queue_size: int = 2, interval: float = 0.0,
+                 stall: float = 5.0, history: int = 1000) -> None:
+        """Create a farm.
+
+        Args:
+            * `device`: Optional; The device to farm on, `adb.device()` if `None`.
+            * `decide`: Optional; A callable taking an observation and returning a list of actions, or
+            `None` to stop, `Farm.decide` if `None`. An observation is a dict of the `frame`, the
+            screen `state`, the `drops` on the result screen, and the time it was `captured`. An
+            action is a tuple of the name of a method of `adb.Device` and its arguments, i.e.
+            `('tap', 100, 200)`.
+            * `stage_id`: Optional; The stage farmed, whose drops are reported if not `None`.
+            * `index`: Optional; The index classifying the screen states, that in `screens.INDEX` if `None`.
+            * `queue_size`: Optional; The capacity of the queues between the stages.
+            * `interval`: Optional; The minimum time between two captures in seconds.
+            * `stall`: Optional; After how many seconds without a changed frame the same screen is
+            decided again, in case an action was lost.
+            * `history`: Optional; How many latencies of every stage are kept.
+        """
+        self.device = device or adb.device()
+        self.decide = decide or self.decide
+        self.stage_id = stage_id
+        self.queue_size = queue_size
+        self.interval = interval
+        self.stall = stall
+        self.classify = index.classify if index is not None else screens.classify
+        self.gate = screens.FrameGate()
+        self.recognizer = recognition.DropRecognizer()
+        self.latencies = {stage: collections.deque(maxlen=history) for stage in STAGES}
+        self.__running = False
+        self.__state = None
+        self.__id = uuid.uuid4().hex
+        self.__battle = 0
+
+    def decide(self, observation: dict) -> list[tuple] or None:
+        """Returns the taps of `TAPS` for the screen state, and reports the drops of every result screen once.
+
+        An unknown screen does not end the result screen, and every battle is reported with a key
+        of this farm and the number of result screens left, so a result screen seen twice is
+        reported once.
+        """
+        previous, state = self.__state, observation['state']
+        if state is not None:
+            self.__state = state
+        if previous == 'result' and state not in (None, 'result'):
+            self.__battle += 1
+        if state not in TAPS:
+            return []
+        if TAPS[state] is None:
+            return None
+        if state == 'result' and previous != 'result' and self.stage_id is not None and observation['drops']:
+            reporter.report(self.stage_id, observation['drops'], key=self.__id + '-' + str(self.__battle))
+        height, width = observation['frame'].shape[:2]
+        return [('tap', round(TAPS[state][0] * width), round(TAPS[state][1] * height))]
+
+    async def run(self, duration: float = None) -> None:
+        """Run the pipeline until the decision stops it, `stop` is called, a stage fails or `duration` seconds pass.
+
+        Raises:
+            The exception raised by a stage.
+        """
+        self.__running = True
+        frames = asyncio.Queue(self.queue_size)
+        observations = asyncio.Queue(self.queue_size)
+        actions = asyncio.Queue(self.queue_size)
+        tasks = [asyncio.create_task(coroutine) for coroutine in (
+            self.__capture(frames), self.__recognize(frames, observations),
+            self.__decide(observations, actions), self.__dispatch(actions))]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=duration, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            self.__running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        """Stop the pipeline after the current items."""
+        self.__running = False
+
+    def stats(self) -> dict[str:dict[str:float]]:
+        """Returns the count, mean and 95th percentile in milliseconds of the latencies of every stage."""
+        result = {}
+        for stage, latencies in self.latencies.items():
+            if latencies:
+                ordered = sorted(latencies)
+                result[stage] = {'count': len(ordered), 'mean': statistics.mean(ordered) * 1000,
+                                 'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000}
+        return result
+
+    @staticmethod
+    async def __put(queue: asyncio.Queue, item) -> None:
+        """Put an item in a queue, dropping the oldest item if it is full."""
+        if queue.full():
+            queue.get_nowait()
+        await queue.put(item)
+
+    async def __capture(self, frames: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while self.__running:
+            begin = time.perf_counter()
+            frame = await loop.run_in_executor(None, lambda: numpy.array(self.device.screencap()))
+            self.latencies['capture'].append(time.perf_counter() - begin)
+            await self.__put(frames, (frame, begin))
+            await asyncio.sleep(max(0.0, self.interval - (time.perf_counter() - begin)))
+
+    async def __recognize(self, frames: asyncio.Queue, observations: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        passed = time.perf_counter()
+        while self.__running:
+            frame, captured = await frames.get()
+            if captured - passed > self.stall:
+                self.gate.reset()
+            if not self.gate.changed(frame):
+                continue
+            passed = captured
+            begin = time.perf_counter()
+            observation = await loop.run_in_executor(None, self.__observe, frame, captured)
+            self.latencies['recognize'].append(time.perf_counter() - begin)
+            await self.__put(observations, observation)
+
+    def __observe(self, frame: numpy.ndarray, captured: float) -> dict:
+        state = self.classify(frame)
+        drops = self.recognizer.recognize(frame) if state == 'result' else []
+        return {'frame': frame, 'state': state, 'drops': drops, 'captured': captured}
+
+    async def __decide(self, observations: asyncio.Queue, actions: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while self.__running:
+            observation = await observations.get()
+            begin = time.perf_counter()
+            decision = await loop.run_in_executor(None, self.decide, observation)
+            self.latencies['decide'].append(time.perf_counter() - begin)
+            if decision is None:
+                self.stop()
+                return
+            if decision:
+                await self.__put(actions, (decision, observation['captured']))
+
+    async def __dispatch(self, actions: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while self.__running:
+            decision, captured = await actions.get()
+            begin = time.perf_counter()
+            for name, *args in decision:
+                await loop.run_in_executor(None, getattr(self.device, name), *args)
+            end = time.perf_counter()
+            self.latencies['dispatch'].append(end - begin)
+            self.latencies['reaction'].append(end - captured)
+
+
+def __main() -> int:
+    import sys
+
+    farm = Farm(stage_id=sys.argv[1] if sys.argv[1:] else None)
+    try:
+        asyncio.run(farm.run())
+    except KeyboardInterrupt:
+        pass
+    for stage, stats in farm.stats().items():
+        print(stage, '次数:', stats['count'], '平均:', round(stats['mean'], 1), 'ms', 'P95:', round(stats['p95'], 1), 'ms')
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
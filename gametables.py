@@ -1,42 +1,255 @@
-from urllib import request
+from urllib import error, parse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
+import http.client
 import json
+import mmap
 import os
+import pickle
+import queue
+import re
+import struct
+import threading
+from collections.abc import Mapping
 
-item_table = {}  # 物品表, key为物品全名, value为itemId
-stage_table = {}  # 关卡表, key为关卡代码, value为stageId
-find_item_name = {}  # 物品表的反函数
-find_stage_code = {}  # 关卡表的反函数
-formula_table = {}  # 合成公式表 key为itemId, value为另一个字典, 其key为合成素材的itemId, value为需要数量
-rarity_table = {}  # 物品稀有度表, key为物品全名, value为物品的稀有度
 
+class LazyTable(Mapping):
+    """A read-only table which is loaded on first access.
 
-def check_table_updates() -> bool:
+    The first access loads the tables of the source file of this table, from the snapshot if
+    it is made from the local data version, or else from the JSON file. The network is never
+    touched, call `load_tables` to download and load the latest tables.
+    """
+
+    lock = threading.RLock()
+
+    def __init__(self, name: str, source: str) -> None:
+        """Create a lazy table.
+
+        Args:
+            * `name`: The name of the table, i.e. `'item_table'`.
+            * `source`: The file name of the JSON file the table is parsed from.
+        """
+        self.name = name
+        self.source = source
+        self.__table = None
+
+    def table(self) -> dict:
+        """Returns the table as a `dict`, loading it if it is not loaded."""
+        table = self.__table
+        if table is None:
+            with self.lock:
+                if self.__table is None:
+                    load_source(self.source)
+                table = self.__table
+        return table
+
+    def fill(self, table: dict) -> None:
+        """Replace the content of the table."""
+        self.__table = table
+
+    def __getitem__(self, key):
+        return self.table()[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.table()
+
+    def __iter__(self):
+        return iter(self.table())
+
+    def __len__(self) -> int:
+        return len(self.table())
+
+    def __repr__(self) -> str:
+        return 'LazyTable(' + repr(self.name) + ', ' + repr(self.source) + ')'
+
+
+item_table = LazyTable('item_table', 'item_table.json')  # 物品表, key为物品全名, value为itemId
+stage_table = LazyTable('stage_table', 'stage_table.json')  # 关卡表, key为关卡代码, value为stageId
+find_item_name = LazyTable('find_item_name', 'item_table.json')  # 物品表的反函数
+find_stage_code = LazyTable('find_stage_code', 'stage_table.json')  # 关卡表的反函数
+formula_table = LazyTable('formula_table', 'building_data.json')  # 合成公式表 key为itemId, value为另一个字典, 其key为合成素材的itemId, value为需要数量
+formula_gold_table = LazyTable('formula_gold_table', 'building_data.json')  # 合成公式的龙门币消耗表, key为itemId, value为消耗的龙门币
+rarity_table = LazyTable('rarity_table', 'item_table.json')  # 物品稀有度表, key为物品全名, value为物品的稀有度
+cost_table = LazyTable('cost_table', 'stage_table.json')  # 关卡理智消耗表, key为stageId, value为消耗的理智
+
+BASE_URL = 'https://raw.githubusercontent.com/Kengxxiao/ArknightsGameData/master/zh_CN/gamedata/excel/'
+TABLES = ['item_table.json', 'stage_table.json', 'building_data.json']
+SNAPSHOT = 'data/tables.snapshot'
+SNAPSHOT_VERSION = 3
+__SNAPSHOT_MAGIC = b'ASHT'
+__SNAPSHOT_HEADER = struct.Struct('<4sII')  # 魔数, 快照格式版本, 索引长度
+# 跳过不含括号和转义的字符串, 匹配到下一个括号或其余的字符串为止
+__JSON_SKIP = re.compile(rb'(?:[^"\[\]{}]++|"[^"\\\[\]{}]*+")*+(?:"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]])')
+__JSON_OPEN = re.compile(rb'\s*\{')
+__JSON_MEMBER = re.compile(rb'\s*("[^"\\]*(?:\\.[^"\\]*)*")\s*:\s*')
+__JSON_SCALAR = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[^,}\s]+')
+__JSON_NEXT = re.compile(rb'\s*([,}])')
+
+
+class ConnectionPool:
+    """A pool of keep-alive HTTP connections to one host.
+
+    Connections are reused across requests instead of being opened for every request,
+    and every thread borrows its own connection, so requests can run concurrently.
+    """
+
+    def __init__(self, url: str) -> None:
+        """Create a connection pool.
+
+        Args:
+            `url`: The URL of the host, only the scheme and the host are used.
+        """
+        parts = parse.urlsplit(url)
+        self.__connection = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.__host = parts.netloc
+        self.__idle = queue.LifoQueue()
+
+    def request(self, method: str, url: str, headers: dict[str:str] = {}) -> http.client.HTTPResponse and bytes:
+        """Send a request over a pooled connection.
+
+        Args:
+            * `method`: The HTTP method.
+            * `url`: The URL of the request.
+            * `headers`: Optional; The headers of the request.
+
+        Returns:
+            * The response, whose body has been read.
+            * The body of the response.
+        """
+        try:
+            connection = self.__idle.get_nowait()
+        except queue.Empty:
+            connection = self.__connection(self.__host, timeout=30)
+        try:
+            connection.request(method, parse.urlsplit(url).path, headers=headers)
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # A kept-alive connection may have been closed by the server, retry on a new one.
+            connection.close()
+            connection = self.__connection(self.__host, timeout=30)
+            connection.request(method, parse.urlsplit(url).path, headers=headers)
+            response = connection.getresponse()
+        body = response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            self.__idle.put(connection)
+        return response, body
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        while not self.__idle.empty():
+            self.__idle.get_nowait().close()
+
+
+def check_table_updates(base_url: str = BASE_URL, pool: ConnectionPool = None) -> bool:
     """Check whether the table needs to be updated.
 
+    Args:
+        * `base_url`: Optional; The URL of the directory holding the tables.
+        * `pool`: Optional; The `ConnectionPool` to the host of `base_url` to send the request over,
+        a new one is used and closed if it is not given.
+
     Returns:
         * A `boolean` indicating whether the tables need updating
         * A `string` indicating the online version.
 
 
     Raises:
-        SSLError:HTTPSConnectionPool: Max retries exceeded with url
+        HTTPError: The server responded with an error.
     """
     if not os.path.exists("data/data_version.txt"):
-        os.mkdir("data/")
+        os.makedirs("data/", exist_ok=True)
         open("data/data_version.txt", "ab").close()
 
-    with (open('data/data_version.txt', 'rb') as f,
-          closing(request.urlopen(
-              'https://raw.githubusercontent.com/Kengxxiao/ArknightsGameData/master/zh_CN/gamedata/excel/data_version.txt'
-          )) as o):
-        online_version = o.read()
+    url = base_url + 'data_version.txt'
+    own = pool is None
+    if own:
+        pool = ConnectionPool(base_url)
+    try:
+        response, online_version = pool.request('GET', url)
+    finally:
+        if own:
+            pool.close()
+    if response.status != 200:
+        raise error.HTTPError(url, response.status, response.reason, response.headers, None)
+    with open('data/data_version.txt', 'rb') as f:
         local_version = f.read()
-        result = online_version != local_version
-    return result, online_version
+    return online_version != local_version, online_version
+
+
+def sync_tables(base_url: str = BASE_URL, directory: str = 'data/', tables: list[str] = TABLES,
+                pool: ConnectionPool = None) -> list[str]:
+    """Download the tables which have changed.
+
+    The tables are requested concurrently over pooled keep-alive connections. Every request
+    is conditional on the `ETag` and `Last-Modified` of the local copy, which are kept in
+    `validators.json`, so an unchanged table costs a `304 Not Modified` response only.
+    A downloaded table is written to a temporary file and then renamed over the old one,
+    so a table is never left half written.
+
+    Args:
+        * `base_url`: Optional; The URL of the directory holding the tables.
+        * `directory`: Optional; The local directory to save the tables in.
+        * `tables`: Optional; The file names of the tables.
+        * `pool`: Optional; The `ConnectionPool` to the host of `base_url` to send the requests over,
+        a new one is used and closed if it is not given.
+
+    Returns:
+        The file names of the tables which are downloaded.
 
+    Raises:
+        HTTPError: The server responded with an error.
+    """
+    os.makedirs(directory, exist_ok=True)
+    validators_path = os.path.join(directory, 'validators.json')
+    try:
+        with open(validators_path, 'rb') as f:
+            validators = json.load(f)
+    except (OSError, ValueError):
+        validators = {}
+
+    def fetch(name: str) -> bool:
+        url = base_url + name
+        path = os.path.join(directory, name)
+        headers = {}
+        if os.path.exists(path) and name in validators:
+            if 'etag' in validators[name]:
+                headers['If-None-Match'] = validators[name]['etag']
+            if 'last_modified' in validators[name]:
+                headers['If-Modified-Since'] = validators[name]['last_modified']
+        response, body = pool.request('GET', url, headers)
+        if response.status == 304:
+            return False
+        if response.status != 200:
+            raise error.HTTPError(url, response.status, response.reason, response.headers, None)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+        validators[name] = {}
+        if response.getheader('ETag'):
+            validators[name]['etag'] = response.getheader('ETag')
+        if response.getheader('Last-Modified'):
+            validators[name]['last_modified'] = response.getheader('Last-Modified')
+        return True
 
-def load_tables() -> None:
+    own = pool is None
+    if own:
+        pool = ConnectionPool(base_url)
+    try:
+        with ThreadPoolExecutor(len(tables)) as executor:
+            updated = list(executor.map(fetch, tables))
+    finally:
+        if own:
+            pool.close()
+        with open(validators_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(validators, f, indent=2)
+        os.replace(validators_path + '.tmp', validators_path)
+    return [name for name, changed in zip(tables, updated) if changed]
+
+
+def load_tables(base_url: str = BASE_URL) -> None:
     """Load the tables.
 
     Tables include the following:
@@ -45,61 +258,244 @@ def load_tables() -> None:
         * The 'rarity_table' whose 'key` is the `name` of the item and the `value` is the `rarity` of the item.
         * The `stage_table` whose `key` is the `code` of the stage and the `value` is the `id` of the stage.
         * The `find_stage_code` which is the `transposed` version of the `stage_table`.
+        * The `cost_table` whose `key` is the `id` of the stage and the `value` is the `sanity cost` of the stage.
         * The `formula_table` whose `key` is the `id` of the item to be synthesized into ,and the `value` is another `dict`
         whose `key` is the `id` of the item to be synthesized and the `value` is the `number` of the corresponding item.
+        * The `formula_gold_table` whose `key` is the `id` of the item to be synthesized into and the `value` is the
+        `LMD` the synthesis costs.
 
+    Args:
+        `base_url`: Optional; The URL of the directory holding the tables.
 
     Raises:
-        SSLError:HTTPSConnectionPool: Max retries exceeded with url.
+        HTTPError: The server responded with an error.
     """
-    global item_table, stage_table, find_item_name, find_stage_code, formula_table, rarity_table
-
-    check, online_version = check_table_updates()
-    if check:
-        with open('data/data_version.txt', 'wb') as f:
-            f.write(online_version)
-
-        with (open('data/item_table.json', 'wb') as f,
-              closing(request.urlopen(
-                      'https://raw.githubusercontent.com/Kengxxiao/ArknightsGameData/master/zh_CN/gamedata/excel/item_table.json'
-                      )) as o):
-            online_version = o.read()
-            f.write(online_version)
-
-        with (open('data/stage_table.json', 'wb') as f,
-              closing(request.urlopen(
-                      'https://raw.githubusercontent.com/Kengxxiao/ArknightsGameData/master/zh_CN/gamedata/excel/stage_table.json'
-                      )) as o):
-            online_version = o.read()
-            f.write(online_version)
-
-        with (open('data/building_data.json', 'wb') as f,
-              closing(request.urlopen(
-                      'https://raw.githubusercontent.com/Kengxxiao/ArknightsGameData/master/zh_CN/gamedata/excel/building_data.json'
-                      )) as o):
-            online_version = o.read()
-            f.write(online_version)
-
-    with open('data/item_table.json', 'rb') as f:
-        temp = json.load(f)['items']
+    # 版本检查和表格下载共用同一个连接池
+    with closing(ConnectionPool(base_url)) as pool:
+        check, online_version = check_table_updates(base_url, pool)
+        if check:
+            sync_tables(base_url, pool=pool)
+            with open('data/data_version.txt', 'wb') as f:
+                f.write(online_version)
+
+    with LazyTable.lock:
+        tables = load_snapshot(SNAPSHOT, data_version())
+        if tables is None:
+            tables = parse_tables()
+            save_snapshot(SNAPSHOT, tables, data_version())
+
+        for name, table in tables.items():
+            globals()[name].fill(table)
+
+
+def data_version() -> str:
+    """Returns the version of the local tables.
+
+    Raises:
+        FileNotFoundError: The tables have never been downloaded by `load_tables`.
+    """
+    with open('data/data_version.txt', 'rb') as f:
+        return f.read().decode()
+
+
+def load_source(source: str) -> None:
+    """Load the tables parsed from a source file without touching the network.
+
+    Args:
+        `source`: The file name of the JSON file, i.e. `'item_table.json'`.
+
+    Raises:
+        FileNotFoundError: The tables have never been downloaded by `load_tables`.
+    """
+    with LazyTable.lock:
+        names = [name for name, table in globals().items() if isinstance(table, LazyTable) and table.source == source]
+        tables = load_snapshot(SNAPSHOT, data_version(), names)
+        if tables is None:
+            tables = parse_table(source)
+        for name, table in tables.items():
+            globals()[name].fill(table)
+
+
+def parse_tables(directory: str = 'data/') -> dict[str:dict]:
+    """Parse the tables from the JSON files.
+
+    Args:
+        `directory`: Optional; The directory holding the JSON files.
+
+    Returns:
+        A dict mapping the names of the tables, i.e. `'item_table'`, to the tables.
+    """
+    tables = {}
+    for source in TABLES:
+        tables.update(parse_table(source, directory))
+    return tables
+
+
+def parse_table(source: str, directory: str = 'data/') -> dict[str:dict]:
+    """Parse the tables from one JSON file.
+
+    Args:
+        * `source`: The file name of the JSON file, i.e. `'item_table.json'`.
+        * `directory`: Optional; The directory holding the JSON files.
+
+    Returns:
+        A dict mapping the names of the tables parsed from the file to the tables.
+    """
+    path = os.path.join(directory, source)
+    if source == 'item_table.json':
+        item_table, find_item_name, rarity_table = {}, {}, {}
+        temp = extract_json(path, ['items'])['items']
         for value in temp.values():
             item_table[value["name"]] = value["itemId"]
             find_item_name[value['itemId']] = value['name']
             rarity_table[value['name']] = value['rarity']
+        return {'item_table': item_table, 'find_item_name': find_item_name, 'rarity_table': rarity_table}
 
-    with open('data/stage_table.json', 'rb') as f:
-        temp = json.load(f)['stages']
+    if source == 'stage_table.json':
+        stage_table, find_stage_code, cost_table = {}, {}, {}
+        temp = extract_json(path, ['stages'])['stages']
         for value in temp.values():
             stage_table[value['code']] = value['stageId']
             find_stage_code[value['stageId']] = value['code']
+            cost_table[value['stageId']] = value['apCost']
+        return {'stage_table': stage_table, 'find_stage_code': find_stage_code, 'cost_table': cost_table}
 
-    with open('data/building_data.json', 'rb') as f:
-        temp = json.load(f)['workshopFormulas']
+    if source == 'building_data.json':
+        formula_table = {}
+        formula_gold_table = {}
+        temp = extract_json(path, ['workshopFormulas'])['workshopFormulas']
         for value in temp.values():
             tempdir = {}
             for cost in value["costs"]:
                 tempdir[cost['id']] = cost['count']
             formula_table[value['itemId']] = tempdir
+            formula_gold_table[value['itemId']] = value.get('goldCost', 0)
+        return {'formula_table': formula_table, 'formula_gold_table': formula_gold_table}
+
+    raise ValueError('unknown source: ' + source)
+
+
+def extract_json(path: str, keys: list[str]) -> dict:
+    """Decode only some top-level values of a JSON object file.
+
+    The file is memory-mapped and scanned forward once. The members of the top-level object are
+    walked one by one, a container value is stepped over by counting its brackets outside of
+    strings, and only the byte spans of the wanted values are decoded, so the document is
+    neither copied nor turned into objects.
+
+    Args:
+        * `path`: The path of the JSON file, whose top-level value must be an object.
+        * `keys`: The top-level keys whose values are decoded.
+
+    Returns:
+        A dict mapping the keys to their values.
+
+    Raises:
+        KeyError: A key is not a top-level key of the object.
+    """
+    decoder = json.JSONDecoder()
+    wanted = {json.dumps(key).encode(): key for key in keys}
+    result = {}
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        start = __JSON_OPEN.match(m)
+        position = start.end() if start is not None else len(m)
+        while len(result) < len(wanted):
+            member = __JSON_MEMBER.match(m, position)
+            if member is None:
+                break
+            begin = member.end()
+            if begin < len(m) and m[begin] in (0x7b, 0x5b):  # '{', '['
+                end = __skip_container(m, begin)
+            else:
+                scalar = __JSON_SCALAR.match(m, begin)
+                end = scalar.end() if scalar is not None else begin
+            key = wanted.get(member.group(1))
+            if key is not None:
+                result[key] = decoder.raw_decode(m[begin:end].decode())[0]
+            after = __JSON_NEXT.match(m, end)
+            if after is None or after.group(1) == b'}':
+                break
+            position = after.end()
+    for key in keys:
+        if key not in result:
+            raise KeyError(key)
+    return result
+
+
+def __skip_container(m: mmap.mmap, begin: int) -> int:
+    """Returns the end of the object or array beginning at `begin`."""
+    depth = 0
+    for token in __JSON_SKIP.finditer(m, begin):
+        last = m[token.end() - 1]
+        if last == 0x7b or last == 0x5b:  # '{', '['
+            depth += 1
+        elif last == 0x7d or last == 0x5d:  # '}', ']'
+            depth -= 1
+            if depth == 0:
+                return token.end()
+    return len(m)
+
+
+def save_snapshot(path: str, tables: dict[str:dict], data_version: str) -> None:
+    """Save the tables to a snapshot.
+
+    The snapshot starts with a fixed header and a JSON index recording the data version and
+    where every table is, followed by every table pickled separately, so that a table can be
+    loaded without touching the others. The file is written atomically.
+
+    Args:
+        * `path`: The path of the snapshot.
+        * `tables`: A dict mapping the names of the tables to the tables.
+        * `data_version`: The content of `data_version.txt` the tables are parsed from.
+    """
+    sections = [pickle.dumps(table, pickle.HIGHEST_PROTOCOL) for table in tables.values()]
+    index, offset = {}, 0
+    for name, section in zip(tables, sections):
+        index[name] = [offset, len(section)]
+        offset += len(section)
+    header = json.dumps({'data_version': data_version, 'tables': index}).encode()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(__SNAPSHOT_HEADER.pack(__SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for section in sections:
+            f.write(section)
+    os.replace(path + '.tmp', path)
+
+
+def load_snapshot(path: str, data_version: str, names: list[str] = None) -> dict[str:dict] or None:
+    """Load the tables from a snapshot.
+
+    The snapshot is memory-mapped and only the requested tables are unpickled.
+
+    Args:
+        * `path`: The path of the snapshot.
+        * `data_version`: The data version the snapshot must be made from.
+        * `names`: Optional; The names of the tables to load, all the tables if `None`.
+
+    Returns:
+        A dict mapping the names of the tables to the tables, or `None` if the snapshot does not
+        exist, is of another format version, or is made from another data version.
+    """
+    try:
+        with open(path, 'rb') as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    with m, memoryview(m) as view:
+        if len(view) < __SNAPSHOT_HEADER.size:
+            return None
+        magic, version, size = __SNAPSHOT_HEADER.unpack_from(view)
+        if magic != __SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            return None
+        start = __SNAPSHOT_HEADER.size + size
+        header = json.loads(bytes(view[__SNAPSHOT_HEADER.size: start]))
+        if header['data_version'] != data_version:
+            return None
+        tables = {}
+        for name in header['tables'] if names is None else names:
+            offset, length = header['tables'][name]
+            tables[name] = pickle.loads(view[start + offset: start + offset + length])
+    return tables
 
 
 def __main() -> int:
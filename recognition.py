@@ -0,0 +1,382 @@
+import json
+import os
+import threading
+
+import numpy
+from PIL import Image
+
+import gametables
+
+ICONS = 'data/icons/'  # 物品图标目录, 文件名为itemId.png
+DIGITS = 'data/digits/'  # 数字模板目录, 文件名为0.png到9.png
+TEMPLATE_SIZE = 32
+DIGIT_SIZE = 16
+ICON_RATIO = 0.139  # 结算界面物品图标边长与16:9屏幕高度之比
+ICON_SCALES = (0.9, 1.0, 1.1)  # 相对图标边长的多个尺度, 容纳不同机型的界面缩放
+# 结算界面掉落类型标签的颜色(RGB), 需按实际截图校准
+DROP_TYPE_COLORS = {
+    'NORMAL_DROP': (140, 140, 140),
+    'SPECIAL_DROP': (227, 99, 6),
+    'EXTRA_DROP': (70, 157, 69),
+    'FURNITURE': (171, 111, 213),
+}
+LABEL_DISTANCE = 60  # 标签颜色与最近的掉落类型颜色的最大RGB距离, 超过则不认为是标签
+
+
+def resize(image: numpy.ndarray, height: int, width: int) -> numpy.ndarray:
+    """Resize an image by nearest-neighbor sampling.
+
+    Args:
+        * `image`: An array whose first two axes are the rows and the columns.
+        * `height`: The height of the result.
+        * `width`: The width of the result.
+    """
+    rows = (numpy.arange(height) * image.shape[0] // height)
+    columns = (numpy.arange(width) * image.shape[1] // width)
+    return image[rows[:, None], columns]
+
+
+def normalize(vectors: numpy.ndarray) -> numpy.ndarray:
+    """Returns the rows of `vectors` with zero mean and unit norm, so that their dot products are correlations."""
+    vectors = vectors.astype(numpy.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / numpy.maximum(norms, 1e-6)
+
+
+def runs(mask: numpy.ndarray, minimum: int = 1) -> list[tuple[int, int]]:
+    """Returns the `[start, end)` ranges of the runs of `True` in a 1-D mask at least `minimum` long."""
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate([[0], mask.astype(numpy.int8), [0]])))
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2]) if end - start >= minimum]
+
+
+class TemplateBank:
+    """Templates of the same size stacked in one normalized matrix.
+
+    A batch of patches is matched against all the templates by one matrix product of their
+    normalized pixels, which gives the correlation of every patch with every template.
+    """
+
+    def __init__(self, ids: list[str], images: numpy.ndarray) -> None:
+        """Create a template bank.
+
+        Args:
+            * `ids`: The ids of the templates.
+            * `images`: An array of shape `(len(ids), height, width, ...)` holding the templates.
+        """
+        self.ids = list(ids)
+        self.shape = images.shape[1:]
+        self.matrix = normalize(images.reshape(len(ids), int(numpy.prod(self.shape))))
+
+    @classmethod
+    def from_matrix(cls, ids: list[str], shape: tuple, matrix: numpy.ndarray) -> 'TemplateBank':
+        """Create a template bank from templates already normalized, which may be a memory map.
+
+        Args:
+            * `ids`: The ids of the templates.
+            * `shape`: The shape of a template.
+            * `matrix`: An array of shape `(len(ids), size of a template)` holding the normalized templates.
+        """
+        bank = cls.__new__(cls)
+        bank.ids, bank.shape, bank.matrix = list(ids), tuple(shape), matrix
+        return bank
+
+    @classmethod
+    def from_directory(cls, directory: str, ids: list[str], size: int, mode: str = 'RGB') -> 'TemplateBank':
+        """Load the templates `<id>.png` in a directory, the missing ones are skipped.
+
+        Args:
+            * `directory`: The directory of the templates.
+            * `ids`: The ids of the templates.
+            * `size`: The width and height the templates are resized to.
+            * `mode`: Optional; The PIL mode the templates are converted to.
+
+        Returns:
+            The bank of the templates found, which is empty if there is none.
+        """
+        found, images = [], []
+        for id in ids:
+            path = os.path.join(directory, id + '.png')
+            if os.path.exists(path):
+                with Image.open(path) as image:
+                    images.append(numpy.asarray(image.convert(mode).resize((size, size), Image.LANCZOS)))
+                found.append(id)
+        if not images:
+            # numpy.stack不接受空列表, 空模板库的形状取自同一模式的空白图像
+            return cls([], numpy.zeros((0,) + numpy.asarray(Image.new(mode, (size, size))).shape, numpy.uint8))
+        return cls(found, numpy.stack(images))
+
+    def match(self, patches: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Match a batch of patches.
+
+        Args:
+            `patches`: An array of shape `(count,) + shape` holding the patches.
+
+        Returns:
+            * The index of the best template of every patch.
+            * The correlation of every patch with its best template, `-inf` if the bank is empty.
+        """
+        if not self.ids:
+            return numpy.zeros(len(patches), int), numpy.full(len(patches), -numpy.inf)
+        scores = normalize(patches.reshape(len(patches), -1)) @ self.matrix.T
+        best = scores.argmax(axis=1)
+        return best, scores[numpy.arange(len(patches)), best]
+
+
+def icon_size(width: int, height: int) -> int:
+    """Returns the nominal side in pixels of an item icon on the result screen of a resolution.
+
+    The UI is scaled to the height of the screen, or to the width on screens narrower than 16:9.
+    """
+    width, height = max(width, height), min(width, height)
+    return round(ICON_RATIO * min(height, width * 9 / 16))
+
+
+class TemplateIndex:
+    """The item icons rendered at the scales of a resolution, stored in a memory-mapped file.
+
+    Every icon is rendered at each scale the way the device draws it, then sampled on the same
+    `TEMPLATE_SIZE` grid the recognizer samples the screen on, and normalized. The templates of all
+    the scales are one contiguous array of shape `(len(sizes), len(ids), TEMPLATE_SIZE ** 2 * 3)`
+    in a `.npy` file, so that loading the index maps the file instead of decoding and resizing the
+    icons. A JSON file beside it keeps the resolution, the data version, the sizes and the ids,
+    which are the keys of `gametables.find_item_name`.
+
+    Example:
+
+        index = template_index(*adb.wm_size())
+        bank = index.bank(128)  # the template bank of the scale closest to 128 pixels
+    """
+
+    def __init__(self, path: str) -> None:
+        """Load an index built by `build_index`.
+
+        Args:
+            `path`: The path of the `.npy` file.
+        """
+        with open(path[:-len('.npy')] + '.json', 'rb') as f:
+            header = json.load(f)
+        self.path = path
+        self.size = tuple(header['size'])
+        self.data_version = header['data_version']
+        self.sizes = header['sizes']
+        self.ids = header['ids']
+        self.array = numpy.load(path, mmap_mode='r')
+        shape = (TEMPLATE_SIZE, TEMPLATE_SIZE, 3)
+        self.banks = [TemplateBank.from_matrix(self.ids, shape, matrix) for matrix in self.array]
+
+    def bank(self, size: int) -> TemplateBank:
+        """Returns the template bank of the scale closest to an icon side in pixels."""
+        return self.banks[min(range(len(self.sizes)), key=lambda i: abs(self.sizes[i] - size))]
+
+    def name(self, id: str) -> str:
+        """Returns the name of an item in the index."""
+        return gametables.find_item_name[id]
+
+
+def index_path(width: int, height: int, directory: str = 'data/') -> str:
+    """Returns the path of the template index of a resolution."""
+    width, height = max(width, height), min(width, height)
+    return os.path.join(directory, 'icons_%dx%d.npy' % (width, height))
+
+
+def build_index(width: int, height: int, data_version: str, icons: str = ICONS, path: str = None) -> str:
+    """Render the item icons at the scales of a resolution and save them as a template index.
+
+    Args:
+        * `width`: The horizontal resolution of the screen.
+        * `height`: The vertical resolution of the screen.
+        * `data_version`: The version of the tables the index is built from.
+        * `icons`: Optional; The directory of the icons `<itemId>.png`.
+        * `path`: Optional; The path of the `.npy` file, `index_path(width, height)` if `None`.
+
+    Returns:
+        The path of the `.npy` file.
+    """
+    path = path or index_path(width, height)
+    sizes = [round(icon_size(width, height) * scale) for scale in ICON_SCALES]
+    ids = [id for id in gametables.find_item_name if os.path.exists(os.path.join(icons, id + '.png'))]
+    tmp = path + '.tmp.npy'
+    array = numpy.lib.format.open_memmap(tmp, 'w+', numpy.float32, (len(sizes), len(ids), TEMPLATE_SIZE ** 2 * 3))
+    for i, id in enumerate(ids):
+        with Image.open(os.path.join(icons, id + '.png')) as image:
+            image = image.convert('RGB')
+            for j, size in enumerate(sizes):
+                rendered = numpy.asarray(image.resize((size, size), Image.LANCZOS))
+                array[j, i] = normalize(resize(rendered, TEMPLATE_SIZE, TEMPLATE_SIZE).reshape(1, -1))[0]
+    array.flush()
+    del array
+    header = {'size': [max(width, height), min(width, height)], 'data_version': data_version,
+              'sizes': sizes, 'ids': ids}
+    with open(path[:-len('.npy')] + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump(header, f)
+    os.replace(tmp, path)
+    os.replace(path[:-len('.npy')] + '.json.tmp', path[:-len('.npy')] + '.json')
+    return path
+
+
+__indexes = {}  # 模板索引缓存, key为分辨率, value为对应的TemplateIndex
+__lock = threading.Lock()
+
+
+def template_index(width: int = None, height: int = None) -> TemplateIndex:
+    """Returns the template index of a resolution, which is built once per resolution and data version.
+
+    Args:
+        * `width`: Optional; The horizontal resolution of the screen, that of the connected device if `None`.
+        * `height`: Optional; The vertical resolution of the screen, that of the connected device if `None`.
+    """
+    if width is None or height is None:
+        import adb
+
+        width, height = adb.wm_size()
+    key = max(width, height), min(width, height)
+    version = gametables.data_version()
+    with __lock:
+        index = __indexes.get(key)
+        if index is None or index.data_version != version:
+            __indexes.pop(key, None)
+            index = None
+            path = index_path(*key)
+            try:
+                with open(path[:-len('.npy')] + '.json', 'rb') as f:
+                    fresh = json.load(f)['data_version'] == version
+            except (OSError, ValueError, KeyError):
+                fresh = False
+            if not fresh:
+                build_index(*key, version, path=path)
+            __indexes[key] = index = TemplateIndex(path)
+        return index
+
+
+class DropRecognizer:
+    """Recognize the drops on the battle result screen.
+
+    The drops are in a row at the bottom right of the result screen. The item slots are segmented
+    by the columns brighter than the background, and the top of every icon by the rows of its
+    column brighter than the background. The icons are matched against the template bank of the
+    items, the quantities at their bottom right are read by matching the digits, and the drop
+    types are told by the color of the label under them. A drop whose label is missing or of
+    none of the `DROP_TYPE_COLORS` is left out, since it cannot be reported.
+
+    Example:
+
+        recognizer = DropRecognizer()
+        reporter.report(stage_id, recognizer.recognize(adb.screencap()))
+    """
+
+    def __init__(self, items: TemplateBank or TemplateIndex = None, digits: TemplateBank = None,
+                 region: tuple[float, float, float, float] = (0.43, 0.68, 1.0, 0.94),
+                 threshold: float = 0.6) -> None:
+        """Create a recognizer.
+
+        Args:
+            * `items`: Optional; The template bank or the template index of the items, the index of
+            the resolution of every frame by `template_index` if `None`.
+            * `digits`: Optional; The template bank of the digits in `DIGITS` if `None`.
+            * `region`: Optional; The left, top, right and bottom of the drop row as fractions of the screen.
+            * `threshold`: Optional; The minimum correlation for an icon to be recognized.
+        """
+        self.items = items
+        self.digits = digits or TemplateBank.from_directory(DIGITS, [str(i) for i in range(10)], DIGIT_SIZE, 'L')
+        self.region = region
+        self.threshold = threshold
+        self.__colors = numpy.array(list(DROP_TYPE_COLORS.values()), numpy.float32)
+
+    def slots(self, frame: numpy.ndarray) -> list[tuple[int, int, int]]:
+        """Segment the item slots of a result screen.
+
+        Args:
+            `frame`: An array of shape `(height, width, 3 or 4)` holding the screen.
+
+        Returns:
+            The left, right and top of every slot in the frame, a slot is as high as it is wide.
+        """
+        height, width = frame.shape[:2]
+        left, top = int(self.region[0] * width), int(self.region[1] * height)
+        right, bottom = int(self.region[2] * width), int(self.region[3] * height)
+        bright = frame[top:bottom, left:right, :3].mean(axis=2) > 60
+        occupied = bright.mean(axis=0) > 0.25
+        minimum = (bottom - top) // 3
+        slots = []
+        for start, end in runs(occupied, minimum):
+            # 图标是列中第一段足够高的亮行, 其下方的标签是较矮的另一段
+            rows = runs(bright[:, start:end].mean(axis=1) > 0.25, (end - start) // 2)
+            if rows:
+                slots.append((left + start, left + end, top + rows[0][0]))
+        return slots
+
+    def label(self, frame: numpy.ndarray, slot: tuple[int, int, int]) -> str or None:
+        """Returns the drop type told by the label under the icon of a slot, or `None` if there is no label."""
+        left, right, top = slot
+        bottom = int(self.region[3] * frame.shape[0])
+        below = frame[top + right - left: bottom, left:right, :3]
+        bands = runs(below.mean(axis=2).mean(axis=1) > 60)
+        if not bands:
+            return None
+        start, end = bands[0]
+        color = below[start:end].reshape(-1, 3).mean(axis=0)
+        distances = ((self.__colors - color) ** 2).sum(axis=1)
+        if distances.min() > LABEL_DISTANCE ** 2:
+            return None
+        return list(DROP_TYPE_COLORS)[distances.argmin()]
+
+    def recognize(self, frame: numpy.ndarray) -> list[dict[str:str or int]]:
+        """Recognize the drops of a result screen.
+
+        Args:
+            `frame`: An array of shape `(height, width, 3 or 4)` holding the screen.
+
+        Returns:
+            The drops in the format `reporter.report` takes.
+        """
+        slots = self.slots(frame)
+        bank = self.bank(frame, slots)
+        if not slots or not bank.ids:
+            return []
+        size = bank.shape[0]
+        icons = numpy.stack([resize(frame[top:top + right - left, left:right, :3], size, size)
+                             for left, right, top in slots])
+        best, scores = bank.match(icons)
+        drops = []
+        for (left, right, top), index, score in zip(slots, best, scores):
+            drop_type = self.label(frame, (left, right, top))
+            if score < self.threshold or drop_type is None:
+                continue
+            quantity = self.quantity(frame[top + (right - left) // 2: top + right - left, left + (right - left) // 2: right])
+            drops.append({'dropType': drop_type, 'itemId': bank.ids[index], 'quantity': quantity})
+        return drops
+
+    def bank(self, frame: numpy.ndarray, slots: list[tuple[int, int, int]]) -> TemplateBank:
+        """Returns the template bank of the items matching the slots of a frame."""
+        items = self.items or template_index(frame.shape[1], frame.shape[0])
+        if isinstance(items, TemplateIndex):
+            return items.bank(int(numpy.median([right - left for left, right, top in slots])) if slots else 0)
+        return items
+
+    def quantity(self, patch: numpy.ndarray) -> int:
+        """Read the quantity in the bottom right quarter of a slot, 1 if there is no digit."""
+        if not self.digits.ids:
+            return 1
+        gray = patch[..., :3].mean(axis=2)
+        mask = gray > 200
+        columns = runs(mask.any(axis=0))
+        rows = runs(mask.any(axis=1))
+        if not columns or not rows:
+            return 1
+        top, bottom = rows[-1]
+        digits = numpy.stack([resize(gray[top:bottom, start:end], DIGIT_SIZE, DIGIT_SIZE) for start, end in columns])
+        best, scores = self.digits.match(digits)
+        text = ''.join(self.digits.ids[index] for index, score in zip(best, scores) if score >= self.threshold)
+        return int(text) if text else 1
+
+
+def __main() -> int:
+    import adb
+
+    print(DropRecognizer().recognize(adb.screencap()))
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
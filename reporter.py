@@ -1,8 +1,354 @@
 from contextlib import closing
+import atexit
+import collections
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
 import requests
 
+BASE_URL = 'https://penguin-stats.io/PenguinStats/api/v2'
+__client = None
+__spool = None
+
+
+class PenguinClient:
+    """A client of the Penguin Stats keeping the login and the connections.
+
+    All the requests share one session, which keeps the cookies and the `PenguinID` of the login
+    and a pool of keep-alive connections. A request answered with `401 Unauthorized` logs in again
+    with the last user id and is retried once.
+
+    Example:
+
+        client = PenguinClient(pool_size=32)
+        client.login(79381157)
+        client.report('main_04-06', drops)
+    """
+
+    def __init__(self, base_url: str = BASE_URL, pool_size: int = 10, timeout: float = 30) -> None:
+        """Create a client.
+
+        Args:
+            * `base_url`: Optional; The URL of the API.
+            * `pool_size`: Optional; The maximum number of connections kept alive, which is the maximum
+            number of requests sent at the same time without opening new connections.
+            * `timeout`: Optional; The timeout of a request in seconds.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.user_id = None
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.__lock = threading.Lock()
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request, logging in again if the login has expired.
+
+        Args:
+            * `method`: The HTTP method.
+            * `path`: The path of the endpoint, i.e. `'/report'`.
+            * `kwargs`: The other arguments of `requests.Session.request`.
+
+        Returns:
+            The response, whose body has been read.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        with closing(self.session.request(method, self.base_url + path, **kwargs)) as response:
+            response.content
+        if response.status_code == 401 and self.user_id is not None and path != '/users':
+            self.login(self.user_id)
+            with closing(self.session.request(method, self.base_url + path, **kwargs)) as response:
+                response.content
+        return response
+
+    def login(self, user_id: int) -> requests.Response:
+        """Login to the Penguin Statistics, the later requests are sent as the user.
+
+        Args:
+            `user_id`: The ID of the user.
+
+        Returns:
+            The response of the login.
+        """
+        with self.__lock:
+            self.user_id = user_id
+            response = self.request('POST', '/users', json=user_id)
+            penguin_id = response.headers.get('X-Penguin-Set-PenguinID')
+            if penguin_id:
+                self.session.headers['Authorization'] = 'PenguinID ' + penguin_id
+        if response.status_code // 100 != 2:
+            print(response.text)
+        return response
+
+    def report(self, stage_id: str, drops: list[dict[str:str or int]], source: str = 'CLIENT_SOURCE',
+               version: str = 'CLIENT_VERSION', server: str = 'CN') -> requests.Response:
+        """Report the drops right away, see `report` for the arguments.
+
+        Returns:
+            The response of the report.
+        """
+        post_data = {"drops": drops, "stageId": stage_id, "server": server, "source": source, "version": version}
+        return self.request('POST', '/report', json=post_data)
+
+    def close(self) -> None:
+        """Close the connections."""
+        self.session.close()
+
+
+def client() -> PenguinClient:
+    """Returns the client shared by `login` and `report`."""
+    global __client
+    if __client is None:
+        __client = PenguinClient()
+    return __client
+
+
+class ReportSpool:
+    """A durable pipeline reporting drops in the background.
+
+    Reports are appended to an on-disk spool and synced before `put` returns, so no report is
+    lost by a network failure or a crash. A background thread sends the pending reports in
+    batches by a `PenguinClient` and appends an acknowledgement to the spool after every batch.
+    A report the server fails to take is retried on its own with exponential backoff, so it does
+    not hold back the later reports, and a network failure delays the whole queue the same way.
+    A report is identified by a fingerprint, and a report put with a `key` whose fingerprint is
+    among the last `history` acknowledged ones is never sent again. The fingerprints of reports
+    without a key are unique, so they are forgotten once acknowledged.
+
+    Example:
+
+        spool = ReportSpool()
+        spool.put('main_04-06', drops)
+        spool.flush()
+    """
+
+    def __init__(self, path: str = 'data/reports.spool', client: PenguinClient = None, batch: int = 20,
+                 backoff: float = 1.0, max_backoff: float = 60.0, history: int = 10000) -> None:
+        """Create a spool and start the background thread, the pending reports in the spool are resent.
+
+        Args:
+            * `path`: Optional; The path of the spool file.
+            * `client`: Optional; The client the reports are sent by, a new client if `None`.
+            * `batch`: Optional; The maximum number of reports sent between two acknowledgements.
+            * `backoff`: Optional; The first delay in seconds before a failed report is retried.
+            * `max_backoff`: Optional; The maximum delay in seconds before a failed report is retried.
+            * `history`: Optional; How many acknowledged fingerprints of reports with a key are kept.
+        """
+        self.path = path
+        self.client = client or PenguinClient()
+        self.batch = batch
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.history = history
+        self.sent = 0
+        self.rejected = 0
+        self.retries = 0
+        self.__pending = {}
+        self.__keyed = set()  # 有key的待发送报告的指纹
+        self.__done = collections.OrderedDict()  # 最近确认的有key报告的指纹, 按确认顺序
+        self.__retry = {}  # 发送失败的报告的指纹: (失败次数, 下次重试的时间)
+        self.__records = 0
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__replay()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.__file = open(path, 'a', encoding='utf-8')
+        self.__thread = threading.Thread(target=self.__run, name='ReportSpool', daemon=True)
+        self.__thread.start()
+
+    def put(self, stage_id: str, drops: list[dict[str:str or int]], source: str = 'CLIENT_SOURCE',
+            version: str = 'CLIENT_VERSION', server: str = 'CN', key: str = None) -> str:
+        """Spool a report, see `report` for the arguments.
+
+        Args:
+            `key`: Optional; What makes the report unique, i.e. an id of the battle. Reports of the same
+            arguments and key are reported once, as long as the fingerprint is among the last `history`
+            acknowledged. Every report is unique if `None`.
+
+        Returns:
+            The fingerprint of the report.
+        """
+        payload = {"drops": drops, "stageId": stage_id, "server": server, "source": source, "version": version}
+        canonical = json.dumps([payload, key or uuid.uuid4().hex], ensure_ascii=False, sort_keys=True)
+        fingerprint = hashlib.sha256(canonical.encode()).hexdigest()
+        with self.__condition:
+            if fingerprint in self.__done or fingerprint in self.__pending:
+                return fingerprint
+            if key is None:
+                self.__append({'fingerprint': fingerprint, 'payload': payload})
+            else:
+                self.__append({'fingerprint': fingerprint, 'payload': payload, 'keyed': True})
+                self.__keyed.add(fingerprint)
+            self.__pending[fingerprint] = payload
+            self.__condition.notify_all()
+        return fingerprint
+
+    def pending(self) -> int:
+        """Returns the number of reports not sent yet."""
+        with self.__condition:
+            return len(self.__pending)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until all the spooled reports are sent.
+
+        Args:
+            `timeout`: Optional; The maximum time to wait in seconds, forever if `None`.
+
+        Returns:
+            Whether all the reports are sent.
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: not self.__pending, timeout)
+
+    def close(self, timeout: float = None) -> None:
+        """Flush the reports and stop the background thread, the reports left are sent by the next spool.
+
+        Args:
+            `timeout`: Optional; The maximum time to wait for the reports to be sent in seconds, forever if `None`.
+        """
+        self.flush(timeout)
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        self.__file.close()
+
+    def __replay(self) -> None:
+        """Load the reports not acknowledged from the spool file, and truncate a record torn by a crash."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self.__records += 1
+            if 'ack' in record:
+                self.__acknowledge(record['ack'])
+            elif 'done' in record:
+                self.__done.update(dict.fromkeys(record['done']))
+            elif record['fingerprint'] not in self.__done:
+                self.__pending[record['fingerprint']] = record['payload']
+                if record.get('keyed'):
+                    self.__keyed.add(record['fingerprint'])
+        if end < len(data):
+            # 崩溃时写了一半的记录, 截掉它, 否则下一条记录会接在它后面而无法解析
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+
+    def __append(self, record: dict) -> None:
+        self.__file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__records += 1
+
+    def __acknowledge(self, fingerprints: list[str]) -> None:
+        """Remove the reports done from the pending reports, and remember the fingerprints of those with a key."""
+        for fingerprint in fingerprints:
+            self.__pending.pop(fingerprint, None)
+            self.__retry.pop(fingerprint, None)
+            if fingerprint in self.__keyed:
+                self.__keyed.discard(fingerprint)
+                self.__done[fingerprint] = None
+        while len(self.__done) > self.history:
+            self.__done.popitem(last=False)
 
-def report(stage_id: str, drops: list[dict[str:str or int]], source: str = 'CLIENT_SOURCE', version: str = 'CLIENT_VERSION', server: str = 'CN') -> None:
+    def __compact(self) -> None:
+        """Rewrite the spool file with the fingerprints of the reports with a key done, and the pending reports."""
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'done': list(self.__done)}) + '\n')
+            for fingerprint, payload in self.__pending.items():
+                record = {'fingerprint': fingerprint, 'payload': payload}
+                if fingerprint in self.__keyed:
+                    record['keyed'] = True
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.__file.close()
+        os.replace(self.path + '.tmp', self.path)
+        self.__file = open(self.path, 'a', encoding='utf-8')
+        self.__records = 1 + len(self.__pending)
+
+    def __send(self, payload: dict) -> bool or None:
+        """Send a report, returns whether it is accepted or rejected, or `None` if the network failed."""
+        try:
+            response = self.client.request('POST', '/report', json=payload)
+        except requests.RequestException:
+            return None
+        if response.status_code // 100 == 2:
+            self.sent += 1
+            return True
+        if response.status_code // 100 == 4 and response.status_code not in (401, 408, 429):
+            print(response.text)
+            self.rejected += 1
+            return True
+        return False
+
+    def __delay(self, failures: int) -> float:
+        """Returns the backoff in seconds after a number of failures in a row."""
+        return min(self.max_backoff, self.backoff * 2 ** (failures - 1)) * random.uniform(0.5, 1)
+
+    def __due(self) -> list[tuple[str, dict]]:
+        """Returns the pending reports not waiting for a retry, at most `batch` of them."""
+        now = time.monotonic()
+        return [(fingerprint, payload) for fingerprint, payload in self.__pending.items()
+                if fingerprint not in self.__retry or self.__retry[fingerprint][1] <= now][:self.batch]
+
+    def __run(self) -> None:
+        failures = 0
+        while True:
+            with self.__condition:
+                if failures:
+                    self.__condition.wait_for(lambda: self.__closed, self.__delay(failures))
+                while not self.__closed and not self.__due():
+                    retry = min((when for _, when in self.__retry.values()), default=None)
+                    self.__condition.wait(None if retry is None else retry - time.monotonic())
+                if self.__closed:
+                    return
+                batch = self.__due()
+            done, failed, offline = [], [], False
+            for fingerprint, payload in batch:
+                result = self.__send(payload)
+                if result is None:
+                    offline = True
+                    break
+                (done if result else failed).append(fingerprint)
+            with self.__condition:
+                if done:
+                    self.__append({'ack': done})
+                    self.__acknowledge(done)
+                    if self.__records > 1000 + 2 * len(self.__pending):
+                        self.__compact()
+                    self.__condition.notify_all()
+                for fingerprint in failed:
+                    count = self.__retry.get(fingerprint, (0, 0))[0] + 1
+                    self.__retry[fingerprint] = count, time.monotonic() + self.__delay(count)
+                self.retries += len(failed) + offline
+                failures = failures + 1 if offline else 0
+
+
+def spool() -> ReportSpool:
+    """Returns the spool shared by `report`, which is flushed at exit for at most 10 seconds."""
+    global __spool
+    if __spool is None:
+        __spool = ReportSpool(client=client())
+        atexit.register(__spool.close, 10)
+    return __spool
+
+
+def report(stage_id: str, drops: list[dict[str:str or int]], source: str = 'CLIENT_SOURCE', version: str = 'CLIENT_VERSION', server: str = 'CN', key: str = None) -> str:
     """Report the drops to the Penguin Stats
 
     Args:
@@ -43,30 +389,26 @@ def report(stage_id: str, drops: list[dict[str:str or int]], source: str = 'CLIE
     * `version`: Optional; The version of the source.
     * `server`: Optional; Indecate the server of this drop sample.
     Support 4 servers now: 'CN', 'US', 'JP', and 'KR'.
+    * `key`: Optional; What makes the report unique, see `ReportSpool.put`.
+
+    The report is spooled and sent in the background by the shared `spool`, call `spool().flush()`
+    to wait for it.
+
+    Returns:
+        The fingerprint of the report.
     """
-    url = "https://penguin-stats.io/PenguinStats/api/v2/report"
-    post_data = {
-        "drops": drops,
-        "stageId": stage_id,
-        "server": server,
-        "source": source,
-        "version": version,
-    }
-    with closing(requests.post(url, json=post_data)) as response:
-        if response.status_code // 100 != 2:
-            print(response.json())
+    return spool().put(stage_id, drops, source, version, server, key)
 
 
 def login(user_id: int) -> None:
     """Login to the Penguin Statistics
 
+    The login is kept by the shared `client`, so the later reports are sent as the user.
+
     Args:
         `user_id`: The ID of the user.
     """
-    url = "https://penguin-stats.io/PenguinStats/api/v2/users"
-    with closing(requests.post(url, json=user_id)) as response:
-        if response.status_code // 100 != 2:
-            print(response.json())
+    client().login(user_id)
 
 
 def __main():
@@ -0,0 +1,242 @@
+import json
+import os
+import sys
+import threading
+import zlib
+
+import numpy
+from PIL import Image
+
+INDEX = 'data/screens.json'  # 界面状态索引
+# 计算哈希的区域, 为左上右下占屏幕的比例: 全屏, 顶栏, 右下角的按钮区
+REGIONS = ((0.0, 0.0, 1.0, 1.0), (0.0, 0.0, 1.0, 0.2), (0.5, 0.6, 1.0, 1.0))
+HASH_SIZE = 8  # 每个区域的哈希为HASH_SIZE * HASH_SIZE位
+SAMPLES = 4  # 哈希的每个格子在每个方向上采样的像素数
+# 变化检测的区域, 为左上右下占屏幕的比例: 全屏, 右下角的按钮区
+GATE_REGIONS = ((0.0, 0.0, 1.0, 1.0), (0.5, 0.6, 1.0, 1.0))
+
+__index = None
+__lock = threading.Lock()
+
+
+def phash(frame: numpy.ndarray, regions: tuple = REGIONS) -> int:
+    """Compute the perceptual hash of a frame.
+
+    Every region is sampled on a grid of `(HASH_SIZE + 1) * SAMPLES` by `HASH_SIZE * SAMPLES`
+    pixels and averaged into `HASH_SIZE + 1` by `HASH_SIZE` cells, and every bit tells whether a
+    cell is brighter than its right neighbor. The bits of the regions are concatenated.
+
+    Args:
+        * `frame`: An array of shape `(height, width, 3 or 4)` holding the screen.
+        * `regions`: Optional; The left, top, right and bottom of the regions as fractions of the screen.
+
+    Returns:
+        The hash of `len(regions) * HASH_SIZE ** 2` bits.
+    """
+    height, width = frame.shape[:2]
+    columns, rows = (HASH_SIZE + 1) * SAMPLES, HASH_SIZE * SAMPLES
+    result = 0
+    for left, top, right, bottom in regions:
+        xs = (left + (right - left) * (numpy.arange(columns) + 0.5) / columns) * width
+        ys = (top + (bottom - top) * (numpy.arange(rows) + 0.5) / rows) * height
+        pixels = frame[ys.astype(int)[:, None], xs.astype(int), :3].astype(numpy.float32).sum(axis=2)
+        cells = pixels.reshape(HASH_SIZE, SAMPLES, HASH_SIZE + 1, SAMPLES).sum(axis=(1, 3))
+        bits = (cells[:, :-1] > cells[:, 1:]).ravel()
+        result = result << HASH_SIZE ** 2 | int.from_bytes(numpy.packbits(bits).tobytes(), 'big')
+    return result
+
+
+class ScreenIndex:
+    """A hash index of the known screen states, looked up within a Hamming radius.
+
+    The hashes are split into `radius + 1` chunks. Two hashes within the radius agree on at
+    least one chunk, so the candidates of a lookup are found in the buckets of its chunks, and
+    only those are compared bit by bit.
+
+    Example:
+
+        index = ScreenIndex.load()
+        index.classify(adb.screencap())  # 'result', or None for an unknown screen
+    """
+
+    def __init__(self, radius: int = 10, regions: tuple = REGIONS) -> None:
+        """Create an empty index.
+
+        Args:
+            * `radius`: Optional; The maximum Hamming distance of a hash to a known state.
+            * `regions`: Optional; The regions hashed, see `phash`.
+        """
+        self.radius = radius
+        self.regions = tuple(tuple(region) for region in regions)
+        self.entries = []
+        bits = len(self.regions) * HASH_SIZE ** 2
+        bounds = [bits * i // (radius + 1) for i in range(radius + 2)]
+        self.__chunks = [(low, (1 << high - low) - 1) for low, high in zip(bounds, bounds[1:])]
+        self.__buckets = [{} for _ in self.__chunks]
+
+    def add(self, hash: int, label: str) -> None:
+        """Add the hash of a screen state."""
+        entry = (hash, label)
+        self.entries.append(entry)
+        for (shift, mask), buckets in zip(self.__chunks, self.__buckets):
+            buckets.setdefault(hash >> shift & mask, []).append(entry)
+
+    def lookup(self, hash: int) -> tuple[str, int]:
+        """Returns the label of the nearest known hash within the radius and its distance, or `None` and `-1`."""
+        label, distance = None, self.radius + 1
+        for (shift, mask), buckets in zip(self.__chunks, self.__buckets):
+            for known, known_label in buckets.get(hash >> shift & mask, ()):
+                d = bin(known ^ hash).count('1')
+                if d < distance:
+                    label, distance = known_label, d
+        return (label, distance) if label is not None else (None, -1)
+
+    def classify(self, frame: numpy.ndarray) -> str:
+        """Returns the screen state of a frame, or `None` if it is unknown."""
+        return self.lookup(phash(frame, self.regions))[0]
+
+    def save(self, path: str = INDEX) -> None:
+        """Save the index as JSON."""
+        data = {'radius': self.radius, 'regions': self.regions,
+                'entries': [[format(hash, 'x'), label] for hash, label in self.entries]}
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str = INDEX) -> 'ScreenIndex':
+        """Load an index saved by `save`."""
+        with open(path, 'rb') as f:
+            data = json.load(f)
+        index = cls(data['radius'], data['regions'])
+        for hash, label in data['entries']:
+            index.add(int(hash, 16), label)
+        return index
+
+
+class FrameGate:
+    """Drop the frames that have not changed since the previous one.
+
+    Every region is sampled sparsely and averaged into a small grid of cells, which are
+    quantized and checksummed. A frame passes the gate when the checksum of any region differs
+    from that of the previous frame, so a static screen costs a few thousand sampled pixels
+    instead of a full recognition.
+
+    Example:
+
+        gate = FrameGate()
+        for frame in gate.filter(adb.Screencap().stream(0.5)):
+            recognize(frame)  # only the frames that have changed
+        gate.skip_rate()  # the fraction of the frames skipped
+    """
+
+    def __init__(self, regions: tuple = GATE_REGIONS, grid: tuple[int, int] = (16, 9), step: int = 8) -> None:
+        """Create a gate.
+
+        Args:
+            * `regions`: Optional; The left, top, right and bottom of the regions as fractions of the screen.
+            * `grid`: Optional; The columns and rows of cells each region is averaged into.
+            * `step`: Optional; The quantization step of the cells, which absorbs the noise of encoding.
+        """
+        self.regions = regions
+        self.grid = grid
+        self.step = step
+        self.checksums = None
+        self.frames = 0
+        self.skipped = 0
+
+    def checksums_of(self, frame: numpy.ndarray) -> list[int]:
+        """Returns the checksums of the regions of a frame."""
+        height, width = frame.shape[:2]
+        columns, rows = self.grid[0] * SAMPLES, self.grid[1] * SAMPLES
+        checksums = []
+        for left, top, right, bottom in self.regions:
+            xs = (left + (right - left) * (numpy.arange(columns) + 0.5) / columns) * width
+            ys = (top + (bottom - top) * (numpy.arange(rows) + 0.5) / rows) * height
+            pixels = frame[ys.astype(int)[:, None], xs.astype(int), :3].astype(numpy.uint16)
+            cells = pixels.reshape(self.grid[1], SAMPLES, self.grid[0], SAMPLES, -1).sum(axis=(1, 3))
+            quantized = (cells // (SAMPLES ** 2 * self.step)).astype(numpy.uint8)
+            checksums.append(zlib.crc32(quantized.tobytes()))
+        return checksums
+
+    def changed(self, frame: numpy.ndarray) -> bool:
+        """Returns whether a frame has changed since the previous frame, and counts it."""
+        checksums = self.checksums_of(frame)
+        changed = checksums != self.checksums
+        self.checksums = checksums
+        self.frames += 1
+        self.skipped += not changed
+        return changed
+
+    def filter(self, frames):
+        """Yields the frames of an iterable that have changed."""
+        for frame in frames:
+            if self.changed(frame):
+                yield frame
+
+    def reset(self) -> None:
+        """Forget the previous frame, so that the next frame passes."""
+        self.checksums = None
+
+    def skip_rate(self) -> float:
+        """Returns the fraction of the frames skipped."""
+        return self.skipped / self.frames if self.frames else 0.0
+
+
+def train(directory: str, path: str = INDEX, radius: int = 10) -> ScreenIndex:
+    """Build the index of the screen states from labeled screenshots and save it.
+
+    Args:
+        * `directory`: A directory with a subdirectory of PNG screenshots for every state, whose
+        name is the label, i.e. `main_menu`, `stage_select`, `battle`, `result`, `sanity_refill`.
+        * `path`: Optional; Where the index is saved.
+        * `radius`: Optional; The maximum Hamming distance of a hash to a known state.
+
+    Returns:
+        The index.
+    """
+    index = ScreenIndex(radius)
+    for label in sorted(os.listdir(directory)):
+        folder = os.path.join(directory, label)
+        if not os.path.isdir(folder):
+            continue
+        seen = set()
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.png'):
+                with Image.open(os.path.join(folder, name)) as image:
+                    hash = phash(numpy.asarray(image.convert('RGB')), index.regions)
+                if hash not in seen:
+                    seen.add(hash)
+                    index.add(hash, label)
+    index.save(path)
+    return index
+
+
+def classify(frame: numpy.ndarray = None) -> str:
+    """Returns the screen state of a frame by the index in `INDEX`, or `None` if it is unknown.
+
+    Args:
+        `frame`: Optional; The frame, captured from the connected device if `None`.
+    """
+    global __index
+    with __lock:
+        if __index is None:
+            __index = ScreenIndex.load()
+    if frame is None:
+        import adb
+
+        frame = adb.screencap()
+    return __index.classify(frame)
+
+
+def __main() -> int:
+    if sys.argv[1:2] == ['train']:
+        index = train(*sys.argv[2:3] or ['data/screens/'])
+        print('已训练:', len(index.entries), '个哈希', sorted({label for _, label in index.entries}))
+    else:
+        print(classify())
+    return 0
+
+
+if __name__ == '__main__':
+    __main()
@@ -0,0 +1,44 @@
+import subprocess
+import unittest
+
+import adb
+import adbclient
+import fakeadb
+
+
+class ShellTest(unittest.TestCase):
+    """Test `adb.Shell` against a `fakeadb.FakeServer`."""
+
+    def setUp(self) -> None:
+        self.device = fakeadb.FakeDevice('fake-1')
+        self.server = fakeadb.FakeServer([self.device])
+        self.shell = adb.Shell(client=adbclient.Client('fake-1', port=self.server.port, timeout=5), timeout=5)
+
+    def tearDown(self) -> None:
+        self.shell.close()
+        self.shell.client.close()
+        self.server.__exit__(None, None, None)
+
+    def test_run(self) -> None:
+        self.assertEqual(self.shell.run('echo hi; wm size'), 'hi\nPhysical size: 1280x720')
+        self.assertEqual(self.shell.run("printf 'no newline'"), 'no newline')
+        self.shell.run('input tap 100 200')
+        self.assertEqual(self.device.inputs, [('tap', 100, 200)])
+        self.assertEqual(len(self.shell.latencies), 3)
+
+    def test_failure(self) -> None:
+        self.device.failures['input tap'] = 'Error: Injecting to another application requires INJECT_EVENTS permission'
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            self.shell.run('input tap 100 200')
+        self.assertEqual(context.exception.returncode, 1)
+        self.assertIn('INJECT_EVENTS', context.exception.output)
+        self.assertEqual(self.device.inputs, [])
+        # The shell stays usable, and only the status of the last command counts.
+        self.shell.run('input keyevent 3')
+        self.assertEqual(self.shell.run('input tap 1 2; echo ok'), 'Error: Injecting to another application '
+                                                                    'requires INJECT_EVENTS permission\nok')
+        self.assertEqual(self.device.inputs, [('keyevent', 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
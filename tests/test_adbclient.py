@@ -0,0 +1,125 @@
+import io
+import os
+import stat
+import tempfile
+import unittest
+
+import adbclient
+import fakeadb
+
+
+class ClientTest(unittest.TestCase):
+    """Test `adbclient.Client` against a `fakeadb.FakeServer`."""
+
+    def setUp(self) -> None:
+        self.device = fakeadb.FakeDevice('fake-1')
+        self.server = fakeadb.FakeServer([self.device, fakeadb.FakeDevice('fake-2')])
+        self.client = adbclient.Client('fake-1', port=self.server.port, timeout=5)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.__exit__(None, None, None)
+        self.directory.cleanup()
+
+    def path(self, *names: str) -> str:
+        return os.path.join(self.directory.name, *names)
+
+    def test_devices(self) -> None:
+        self.assertEqual(self.client.devices(), ['fake-1\tdevice', 'fake-2\tdevice'])
+        self.assertEqual(self.client.host_service('host:version'), '0029')
+
+    def test_transport_fail(self) -> None:
+        client = adbclient.Client('missing', port=self.server.port, timeout=5)
+        with self.assertRaisesRegex(ConnectionError, "device 'missing' not found"):
+            client.shell('echo hi')
+        any_device = adbclient.Client(port=self.server.port, timeout=5)
+        with self.assertRaisesRegex(ConnectionError, 'more than one device'):
+            any_device.shell('echo hi')
+
+    def test_shell_and_exec(self) -> None:
+        self.assertEqual(self.client.shell('echo hi; wm size'), 'hi\nPhysical size: 1280x720\n')
+        self.client.shell('input tap 100 200')
+        self.assertEqual(self.device.inputs, [('tap', 100, 200)])
+        with self.client.exec('getprop ro.product.cpu.abi') as connection:
+            self.assertEqual(connection.read(), b'x86_64\n')
+
+    def test_stat_and_list(self) -> None:
+        self.device.files['/sdcard/a/b.txt'] = [b'abc', stat.S_IFREG | 0o644, 1000]
+        self.device.files['/sdcard/a/c/d.txt'] = [b'de', stat.S_IFREG | 0o600, 2000]
+        with self.client.sync() as session:
+            self.assertEqual(session.stat('/sdcard/a/b.txt'), (stat.S_IFREG | 0o644, 3, 1000))
+            self.assertTrue(stat.S_ISDIR(session.stat('/sdcard/a')[0]))
+            self.assertEqual(session.stat('/sdcard/missing'), (0, 0, 0))
+            self.assertEqual(sorted(name for name, *_ in session.list('/sdcard/a')), ['b.txt', 'c'])
+            self.assertEqual(sorted(session.walk('/sdcard/a')), ['b.txt', 'c/d.txt'])
+
+    def test_send_and_receive(self) -> None:
+        data = os.urandom(3 * adbclient.SYNC_DATA_MAX + 7)
+        with self.client.sync() as session:
+            self.assertEqual(session.send(io.BytesIO(data), '/sdcard/blob', 0o600, 1234), len(data))
+            self.assertEqual(self.device.files['/sdcard/blob'], [data, stat.S_IFREG | 0o600, 1234])
+            copy = io.BytesIO()
+            self.assertEqual(session.receive('/sdcard/blob', copy), len(data))
+            self.assertEqual(copy.getvalue(), data)
+            with self.assertRaisesRegex(ConnectionError, 'No such file'):
+                session.receive('/sdcard/missing', io.BytesIO())
+
+    def test_push_and_pull(self) -> None:
+        with open(self.path('x.txt'), 'wb') as f:
+            f.write(b'hello')
+        self.assertEqual(self.client.push(self.path('x.txt'), '/sdcard/'), 5)
+        self.assertEqual(self.device.files['/sdcard/x.txt'][0], b'hello')
+        self.assertEqual(self.client.push(self.path('x.txt'), '/sdcard'), 5)
+        self.assertEqual(sorted(self.device.files), ['/sdcard/x.txt'])
+        os.mkdir(self.path('out'))
+        self.assertEqual(self.client.pull('/sdcard/x.txt', self.path('out')), 5)
+        self.assertEqual(os.listdir(self.path('out')), ['x.txt'])
+        with self.assertRaises(ConnectionError):
+            self.client.pull('/sdcard/missing', self.path('out', 'missing'))
+        self.assertEqual(os.listdir(self.path('out')), ['x.txt'])
+
+    def test_push_and_pull_changed(self) -> None:
+        os.makedirs(self.path('tree', 'sub'))
+        for name, data in [('a', b'1'), (os.path.join('sub', 'b'), b'22')]:
+            with open(self.path('tree', name), 'wb') as f:
+                f.write(data)
+        self.assertEqual(self.client.push_changed(self.path('tree'), '/sdcard/tree')['copied'], 2)
+        self.assertEqual(self.client.push_changed(self.path('tree'), '/sdcard/tree')['copied'], 0)
+        self.device.files['/sdcard/tree/sub/b'][0] = b'33'
+        report = self.client.pull_changed('/sdcard/tree', self.path('copy'))
+        self.assertEqual((report['files'], report['copied']), (2, 2))
+        with open(self.path('copy', 'sub', 'b'), 'rb') as f:
+            self.assertEqual(f.read(), b'33')
+        self.assertEqual(self.client.pull_changed('/sdcard/tree', self.path('copy'))['copied'], 0)
+
+    def test_changed_into_directory(self) -> None:
+        with open(self.path('x.txt'), 'wb') as f:
+            f.write(b'hello')
+        self.device.files['/sdcard/dir/other'] = [b'', stat.S_IFREG | 0o644, 0]
+        for destination in ('/sdcard/dir', '/sdcard/new/'):
+            self.assertEqual(self.client.push_changed(self.path('x.txt'), destination)['copied'], 1)
+            self.assertEqual(self.client.push_changed(self.path('x.txt'), destination)['copied'], 0)
+        self.assertEqual(sorted(self.device.files), ['/sdcard/dir/other', '/sdcard/dir/x.txt', '/sdcard/new/x.txt'])
+        os.mkdir(self.path('out'))
+        self.assertEqual(self.client.pull_changed('/sdcard/dir/x.txt', self.path('out'))['copied'], 1)
+        self.assertEqual(self.client.pull_changed('/sdcard/dir/x.txt', self.path('out'))['copied'], 0)
+        self.assertEqual(os.listdir(self.path('out')), ['x.txt'])
+        self.assertEqual(os.stat(self.path('out', 'x.txt')).st_mtime, self.device.files['/sdcard/dir/x.txt'][2])
+
+    def test_pool_reuse(self) -> None:
+        with self.client.sync() as first:
+            pass
+        with self.client.sync() as second:
+            self.assertIs(second, first)
+            with self.client.sync() as third:
+                self.assertIsNot(third, first)
+        with self.assertRaises(ConnectionError):
+            with self.client.sync() as failed:
+                failed.receive('/sdcard/missing', io.BytesIO())
+        with self.client.sync() as after:
+            self.assertIsNot(after, failed)
+
+
+if __name__ == '__main__':
+    unittest.main()
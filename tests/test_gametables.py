@@ -0,0 +1,112 @@
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+from urllib import error
+
+import gametables
+
+
+class TableHandler(http.server.BaseHTTPRequestHandler):
+    """Serve `server.files` with `ETag`s, answering `304` to matching conditional requests."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self) -> None:
+        name = self.path.rsplit('/', 1)[-1]
+        self.server.requests.append((name, self.headers.get('If-None-Match')))
+        if name not in self.server.files:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.server.files[name]
+        etag = '"' + str(hash(body)) + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class SyncTest(unittest.TestCase):
+    """Test `gametables.sync_tables` and `gametables.check_table_updates` against a local HTTP server."""
+
+    def setUp(self) -> None:
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), TableHandler)
+        self.server.files = {'a.json': b'{"a": 1}', 'b.json': b'{"b": 2}', 'data_version.txt': b'v1'}
+        self.server.requests = []
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:' + str(self.server.server_address[1]) + '/tables/'
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join('data', name), 'rb') as f:
+            return f.read()
+
+    def test_sync(self) -> None:
+        tables = ['a.json', 'b.json']
+        self.assertEqual(gametables.sync_tables(self.base_url, 'data', tables), tables)
+        self.assertEqual(self.read('a.json'), b'{"a": 1}')
+        self.server.requests.clear()
+        self.assertEqual(gametables.sync_tables(self.base_url, 'data', tables), [])
+        self.assertTrue(all(etag is not None for _, etag in self.server.requests))
+        self.server.files['b.json'] = b'{"b": 3}'
+        self.assertEqual(gametables.sync_tables(self.base_url, 'data', tables), ['b.json'])
+        self.assertEqual(self.read('b.json'), b'{"b": 3}')
+        self.assertEqual(sorted(os.listdir('data')), ['a.json', 'b.json', 'validators.json'])
+
+    def test_atomic_write(self) -> None:
+        gametables.sync_tables(self.base_url, 'data', ['a.json'])
+        with open(os.path.join('data', 'a.json.tmp'), 'wb') as f:
+            f.write(b'stale')
+        self.server.files['a.json'] = b'{"a": 2}'
+        self.assertEqual(gametables.sync_tables(self.base_url, 'data', ['a.json']), ['a.json'])
+        self.assertEqual(self.read('a.json'), b'{"a": 2}')
+        self.assertFalse(os.path.exists(os.path.join('data', 'a.json.tmp')))
+        del self.server.files['a.json']
+        with self.assertRaises(error.HTTPError):
+            gametables.sync_tables(self.base_url, 'data', ['a.json'])
+        self.assertEqual(self.read('a.json'), b'{"a": 2}')
+        self.assertEqual(sorted(os.listdir('data')), ['a.json', 'validators.json'])
+
+    def test_check_updates(self) -> None:
+        pool = gametables.ConnectionPool(self.base_url)
+        try:
+            self.assertEqual(gametables.check_table_updates(self.base_url, pool), (True, b'v1'))
+            gametables.sync_tables(self.base_url, 'data', ['a.json'], pool)
+            with open(os.path.join('data', 'data_version.txt'), 'wb') as f:
+                f.write(b'v1')
+            self.assertEqual(gametables.check_table_updates(self.base_url, pool), (False, b'v1'))
+            # The version check and the download share one kept-alive connection.
+            self.assertEqual(self.server.connections, 1)
+        finally:
+            pool.close()
+        del self.server.files['data_version.txt']
+        with self.assertRaises(error.HTTPError):
+            gametables.check_table_updates(self.base_url)
+
+
+if __name__ == '__main__':
+    unittest.main()
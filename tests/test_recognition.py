@@ -0,0 +1,56 @@
+import unittest
+
+import numpy
+
+import recognition
+
+
+class DropRecognizerTest(unittest.TestCase):
+    """Test `recognition.DropRecognizer` on synthetic result screens."""
+
+    width, height = 1920, 1080
+
+    def setUp(self) -> None:
+        random = numpy.random.default_rng(0)
+        # Blocky icons between 80 and 200, brighter than the background and without digit-white pixels.
+        self.icons = {id: random.integers(80, 200, (8, 8, 3)).astype(numpy.uint8) for id in ('30012', '30062')}
+        size = recognition.TEMPLATE_SIZE
+        images = numpy.stack([recognition.resize(icon, size, size) for icon in self.icons.values()])
+        digits = recognition.TemplateBank([], numpy.zeros((0, recognition.DIGIT_SIZE, recognition.DIGIT_SIZE)))
+        self.recognizer = recognition.DropRecognizer(recognition.TemplateBank(list(self.icons), images), digits)
+
+    def render(self, top: float, labels: list[str or None]) -> numpy.ndarray:
+        """Draw the icons from `0.5 * width` at `top * height`, with a label of every drop type under them."""
+        frame = numpy.full((self.height, self.width, 3), 20, numpy.uint8)
+        side = recognition.icon_size(self.width, self.height)
+        for i, (icon, label) in enumerate(zip(self.icons.values(), labels)):
+            left, y = self.width // 2 + i * (side + side // 4), int(top * self.height)
+            frame[y:y + side, left:left + side] = recognition.resize(icon, side, side)
+            if label is not None:
+                frame[y + side + 6: y + side + 24, left:left + side] = recognition.DROP_TYPE_COLORS[label]
+        return frame
+
+    def test_drops(self) -> None:
+        for top in (0.68, 0.72):
+            frame = self.render(top, ['NORMAL_DROP', 'EXTRA_DROP'])
+            self.assertEqual(len(self.recognizer.slots(frame)), 2)
+            self.assertEqual(self.recognizer.recognize(frame), [
+                {'dropType': 'NORMAL_DROP', 'itemId': '30012', 'quantity': 1},
+                {'dropType': 'EXTRA_DROP', 'itemId': '30062', 'quantity': 1},
+            ])
+
+    def test_slot_top(self) -> None:
+        frame = self.render(0.72, ['SPECIAL_DROP', 'FURNITURE'])
+        self.assertEqual({top for _, _, top in self.recognizer.slots(frame)}, {int(0.72 * self.height)})
+
+    def test_missing_label(self) -> None:
+        frame = self.render(0.7, [None, 'SPECIAL_DROP'])
+        self.assertEqual(self.recognizer.recognize(frame),
+                         [{'dropType': 'SPECIAL_DROP', 'itemId': '30062', 'quantity': 1}])
+
+    def test_empty_screen(self) -> None:
+        self.assertEqual(self.recognizer.recognize(self.render(0.7, [])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
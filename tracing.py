@@ -0,0 +1,202 @@
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+BUCKETS = 26  # 直方图的桶数, 第i个桶为[2^(i-1), 2^i)微秒, 最后一个桶包含更长的耗时
+
+__tracer = None
+__null = nullcontext()
+
+
+class Tracer:
+    """Record timing spans as Chrome trace events and latency histograms.
+
+    The events have the fields of the vendored `py_trace_event` (`ph`, `category`, `pid`, `tid`,
+    `ts` in microseconds, `name` and `args`), every span is a `B` and an `E` event, and `save`
+    writes them in its `json_with_metadata` layout, so a trace opens in the bundled systrace
+    viewer and in `chrome://tracing`. The latencies are also counted in histograms per
+    operation and per device, whose buckets are powers of 2 in microseconds.
+
+    Example:
+
+        tracer = tracing.enable('data/adb.trace.json')
+        adb.tap(100, 200)
+        tracing.disable()
+        print(tracer.summary())
+    """
+
+    def __init__(self, path: str = None) -> None:
+        """Create a tracer.
+
+        Args:
+            `path`: Optional; Where `save` writes the trace, no trace is written if `None`.
+        """
+        self.path = path
+        self.events = []
+        self.histograms = collections.defaultdict(lambda: [0] * BUCKETS)
+        self.totals = collections.defaultdict(float)
+        self.__pid = os.getpid()
+        self.__threads = set()
+        self.__lock = threading.Lock()
+
+    def begin(self, name: str, device: str) -> float:
+        """Record the beginning of a span and returns its timestamp in microseconds."""
+        tid = threading.get_ident()
+        ts = time.perf_counter() * 1e6
+        with self.__lock:
+            if tid not in self.__threads:
+                self.__threads.add(tid)
+                self.events.append({'ph': 'M', 'category': '__metadata', 'pid': self.__pid, 'tid': tid, 'ts': ts,
+                                    'name': 'thread_name', 'args': {'name': threading.current_thread().name}})
+            self.events.append({'ph': 'B', 'category': 'adb', 'pid': self.__pid, 'tid': tid, 'ts': ts,
+                                'name': name, 'args': {'device': device}})
+        return ts
+
+    def end(self, name: str, device: str, begin: float) -> None:
+        """Record the end of a span begun at `begin`."""
+        ts = time.perf_counter() * 1e6
+        bucket = min(int(ts - begin).bit_length(), BUCKETS - 1)
+        with self.__lock:
+            self.events.append({'ph': 'E', 'category': 'adb', 'pid': self.__pid, 'tid': threading.get_ident(),
+                                'ts': ts, 'name': name, 'args': {}})
+            self.histograms[name, device][bucket] += 1
+            self.totals[name, device] += ts - begin
+
+    @contextmanager
+    def span(self, name: str, device: str = ''):
+        """Record the block as a span."""
+        begin = self.begin(name, device)
+        try:
+            yield
+        finally:
+            self.end(name, device, begin)
+
+    def summary(self) -> dict[tuple[str, str]:dict[str:float]]:
+        """Returns the latencies of every operation on every device.
+
+        Returns:
+            A dict whose `key` is the name of the operation and the serial number of the device, and
+            the `value` is a dict of the `count`, the `mean` in milliseconds, and the upper bounds in
+            milliseconds of the buckets holding the `p50`, `p90` and `p99`.
+        """
+        result = {}
+        with self.__lock:
+            for key, histogram in self.histograms.items():
+                count = sum(histogram)
+                stats = {'count': count, 'mean': self.totals[key] / count / 1000}
+                for label, fraction in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99)]:
+                    seen = 0
+                    for bucket, size in enumerate(histogram):
+                        seen += size
+                        if seen >= fraction * count:
+                            stats[label] = 2 ** bucket / 1000
+                            break
+                result[key] = stats
+        return result
+
+    def save(self, path: str = None) -> None:
+        """Write the trace events to `path`, or to the path of the tracer if `None`."""
+        path = path or self.path
+        with self.__lock:
+            events = list(self.events)
+        header = {'ph': 'M', 'category': 'process_argv', 'pid': self.__pid, 'tid': threading.get_ident(),
+                  'ts': events[0]['ts'] if events else time.perf_counter() * 1e6, 'name': 'process_argv',
+                  'args': {'argv': sys.argv}}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write('{"traceEvents": [\n')
+            json.dump(header, f)
+            for event in events:
+                f.write(',\n')
+                json.dump(event, f)
+            f.write('],\n"metadata": {}}')
+        os.replace(path + '.tmp', path)
+
+
+def enable(path: str = None) -> Tracer:
+    """Start tracing the instrumented operations.
+
+    Args:
+        `path`: Optional; Where the trace is written by `disable`, no trace is written if `None`.
+
+    Returns:
+        The tracer recording the spans.
+    """
+    global __tracer
+    __tracer = Tracer(path)
+    return __tracer
+
+
+def disable() -> Tracer or None:
+    """Stop tracing, write the trace if the tracer has a path, and returns the tracer."""
+    global __tracer
+    tracer, __tracer = __tracer, None
+    if tracer is not None and tracer.path is not None:
+        tracer.save()
+    return tracer
+
+
+def tracer() -> Tracer or None:
+    """Returns the current tracer, or `None` if tracing is disabled."""
+    return __tracer
+
+
+def span(name: str, device: str = ''):
+    """Returns a context manager recording the block as a span, which does nothing if tracing is disabled."""
+    if __tracer is None:
+        return __null
+    return __tracer.span(name, device)
+
+
+def traced(name: str):
+    """Decorate a function or a method as an operation recorded as a span.
+
+    When tracing is disabled, the call only costs a check of the current tracer. The device of
+    a method is the `serial` of its object, or of its `shell`.
+
+    Args:
+        `name`: The name of the operation.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            tracer = __tracer
+            if tracer is None:
+                return function(*args, **kwargs)
+            owner = args[0] if args else None
+            device = getattr(owner, 'serial', None)
+            if device is None:
+                device = getattr(getattr(owner, 'shell', None), 'serial', '')
+            begin = tracer.begin(name, device)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.end(name, device, begin)
+
+        return wrapper
+
+    return decorate
+
+
+def __main() -> int:
+    import adb
+
+    tracer = enable('data/adb.trace.json')
+    adb.devices()
+    adb.wm_size()
+    adb.tap(100, 200)
+    adb.screencap()
+    disable()
+    for (name, device), stats in tracer.summary().items():
+        print(name, device, '次数:', stats['count'], '平均:', round(stats['mean'], 3), 'ms', 'P90:', stats['p90'], 'ms')
+    print('已写入:', tracer.path)
+    return 0
+
+
+if __name__ == '__main__':
+    __main()